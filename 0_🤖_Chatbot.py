@@ -55,10 +55,23 @@
 #             response = st.write_stream(stream)
 #         st.session_state.messages.append({"role": "assistant", "content": response})
 
+import os
+import statistics
+import threading
+import uuid
+from contextlib import nullcontext
+
 import streamlit as st
-from PIL import Image
-import torch
-from transformers import AutoProcessor, AutoModelForVision2Seq
+
+from forfore.answer_cache import AnswerCache
+from forfore.context import ContextWindow, approx_token_count, tokenizer_counter
+from forfore.generation import GenerationTask, ReplyStats, generate_reply, stream_reply
+from forfore.job_retrieval import get_job_retriever, wants_jobs
+from forfore.knowledge import get_knowledge_base, has_knowledge_base
+from forfore.metrics import STAGE_METRICS, start_http_server, write_textfile
+from forfore.models import CPU_MODES
+from forfore.registry import GB, get_registry
+from forfore.worker import WorkerClient, parse_address
 
 # --------------------------
 # Basic Configuration
@@ -69,67 +82,50 @@ st.set_page_config(page_title="ForFore Chatbot", page_icon="💬", layout="cente
 DEFAULT_MODEL_ID = "unsloth/Llama-3.2-11B-Vision-Instruct"
 # DEFAULT_MODEL_ID = "unsloth/Llama-3.2-11B-Vision-Instruct-bnb-4bit"  # 4-bit variant
 
-@st.cache_resource(show_spinner=True)
-def load_model(model_id: str):
-    """Load model and processor once and cache."""
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    dtype = torch.float16 if device == "cuda" else torch.float32
-
-    processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
-    model = AutoModelForVision2Seq.from_pretrained(
-        model_id,
-        torch_dtype=dtype,
-        device_map="auto",
-        trust_remote_code=True,
-    )
-    return processor, model
-
-def generate_reply(user_text: str, image_file, processor, model, max_new_tokens: int = 256):
-    """
-    Llama-3.2-Vision requires a chat template.
-    When an image is present, create a prompt with {"type": "image"} token,
-    then pass it as processor(text=prompt, images=[...]).
-    """
-    if image_file is not None:
-        image = Image.open(image_file).convert("RGB")
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image"},                       # ← Image token
-                    {"type": "text", "text": user_text},     # ← User question
-                ],
-            }
-        ]
-        prompt = processor.apply_chat_template(
-            messages, add_generation_prompt=True
-        )
-        inputs = processor(
-            text=prompt,
-            images=[image],      # Pass as list
-            return_tensors="pt",
-            padding=True
-        ).to(model.device)
+# When set (e.g. "127.0.0.1:8765"), replies come from `python -m forfore.worker`,
+# which batches requests from all sessions, instead of a model loaded in this process.
+WORKER_ADDRESS = os.environ.get("FORFORE_WORKER_ADDRESS")
+# Optional SQLite file that keeps cached answers across restarts
+ANSWER_CACHE_DB = os.environ.get("FORFORE_ANSWER_CACHE_DB")
+# Per-stage latency export: a Prometheus /metrics port and/or a textfile-collector path
+METRICS_PORT = os.environ.get("FORFORE_METRICS_PORT")
+METRICS_HOST = os.environ.get("FORFORE_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("FORFORE_METRICS_FILE")
+if METRICS_PORT:
+    start_http_server(int(METRICS_PORT), METRICS_HOST)
+
+@st.fragment(run_every=1)
+def model_loading_status(model_id: str, cpu_mode: str):
+    """Poll the background load and rerun the whole page once the model is ready."""
+    registry = get_registry()
+    if registry.is_ready(model_id, cpu_mode):
+        st.rerun()
+    error = registry.load_error(model_id, cpu_mode)
+    if error is not None:
+        st.error(f"Could not load {model_id}: {error}")
+        if st.button("🔄 Retry Loading"):
+            registry.clear_error(model_id, cpu_mode)
+            st.rerun()
+        return
+    phase, elapsed = registry.progress(model_id, cpu_mode) or ("Starting", 0.0)
+    st.info(f"⏳ Loading **{model_id}**: {phase}… ({elapsed:.0f}s). Chat opens as soon as the model is ready.")
 
-    else:
-        # For text-only input, also use chat template
-        messages = [
-            {"role": "user", "content": [{"type": "text", "text": user_text}]}
-        ]
-        prompt = processor.apply_chat_template(
-            messages, add_generation_prompt=True
-        )
-        inputs = processor(
-            text=prompt,
-            return_tensors="pt",
-            padding=True
-        ).to(model.device)
 
-    with torch.no_grad():
-        out_ids = model.generate(**inputs, max_new_tokens=max_new_tokens)
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Answers to repeated text-only questions, shared by all sessions."""
+    return AnswerCache(db_path=ANSWER_CACHE_DB)
 
-    return processor.batch_decode(out_ids, skip_special_tokens=True)[0].strip()
+
+# In worker mode the worker decides the model; ask it which one once per session
+worker, worker_error = None, None
+if WORKER_ADDRESS:
+    try:
+        worker = WorkerClient(parse_address(WORKER_ADDRESS))
+        if "worker_model_id" not in st.session_state:
+            st.session_state.worker_model_id = worker.model_id()
+    except (RuntimeError, OSError) as e:
+        worker_error = e
 
 
 # --------------------------
@@ -137,8 +133,44 @@ def generate_reply(user_text: str, image_file, processor, model, max_new_tokens:
 # --------------------------
 with st.sidebar:
     st.markdown("### ⚙️ Settings")
-    model_id = st.text_input("Hugging Face Model ID", value=DEFAULT_MODEL_ID, help="e.g., unsloth/Llama-3.2-11B-Vision-Instruct")
+    model_id = st.text_input(
+        "Hugging Face Model ID", value=st.session_state.get("worker_model_id", DEFAULT_MODEL_ID), disabled=WORKER_ADDRESS is not None,
+        help=f"Served by the inference worker at {WORKER_ADDRESS}" if WORKER_ADDRESS else "e.g., unsloth/Llama-3.2-11B-Vision-Instruct",
+    )
+    draft_model_id = st.text_input(
+        "Draft Model ID (optional)", value="", disabled=WORKER_ADDRESS is not None,
+        help="Small model with the same tokenizer that proposes tokens for the main model to verify "
+             "(speculative decoding, text-only turns), e.g., unsloth/Llama-3.2-1B-Instruct",
+    ).strip()
     max_tokens = st.slider("Max New Tokens", min_value=64, max_value=1024, value=256, step=64)
+    cpu_mode = st.selectbox(
+        "CPU Inference Mode", CPU_MODES, disabled=WORKER_ADDRESS is not None,
+        help="Weight format when no GPU is available: bfloat16 halves memory, int8 quantizes linear layers",
+    )
+    stream_output = st.toggle(
+        "Stream Output", value=WORKER_ADDRESS is None, disabled=WORKER_ADDRESS is not None,
+        help="Show the reply token by token while it is generated",
+    )
+    context_budget = st.slider(
+        "Context Budget (tokens)", min_value=256, max_value=8192, value=2048, step=256,
+        help="Earlier turns beyond this budget are dropped from the prompt",
+    )
+    summarize_context = st.toggle("Summarize Older Turns", value=True, help="Keep a one-line note of dropped questions")
+    use_answer_cache = st.toggle("Reuse Cached Answers", value=True, help="Answer repeated text-only questions from cache")
+    suggest_jobs = st.toggle(
+        "Suggest Job Listings", value=True,
+        help="For questions about work, add the best matching listings from the Jobs page to the prompt",
+    )
+    use_knowledge_base = st.toggle(
+        "Use Visa Knowledge Base", value=has_knowledge_base(), disabled=not has_knowledge_base(),
+        help="Add a few matching passages from the local visa/administrative documents to the prompt",
+    )
+    clear_chat = st.button("🗑️ Clear Conversation", use_container_width=True)
+    # Filled in at the end of the run so the counters include this turn
+    cache_status = st.empty()
+    model_status = st.empty()
+    show_stage_metrics = st.toggle("Show Stage Latency", value=False, help="Debug panel with p50/p95/p99 per pipeline stage")
+    stage_panel = st.empty()
     st.caption("ForFore AI Assistant")
 
 st.title("🤖 ForFore Chatbot 🤖")
@@ -147,35 +179,210 @@ st.write("ForFore is an intelligent administrative and life assistant for foreig
 # New feature announcement
 st.info("💡 **New Feature!** Check out the **Jobs** page in the left sidebar! Find employment opportunities tailored for foreign residents.")
 
-# Load model
-processor, model = load_model(model_id)
+# Load model in the background (or connect to the shared inference worker) so the
+# page renders right away; the chat input stays disabled until the model is ready
+if WORKER_ADDRESS:
+    if worker_error is not None:
+        st.error(f"Could not connect to the inference worker at {WORKER_ADDRESS}: {worker_error}")
+        st.stop()
+    # Cached answers are keyed by the model that actually produced them
+    model_id = st.session_state.worker_model_id
+    model_ready = True
+else:
+    registry = get_registry()
+    registry.load_in_background(model_id, cpu_mode)
+    model_ready = registry.is_ready(model_id, cpu_mode)
+    if not model_ready:
+        model_loading_status(model_id, cpu_mode)
+    # The draft model is optional: chat without it until it is loaded
+    if draft_model_id:
+        registry.load_in_background(draft_model_id, cpu_mode)
+        draft_error = registry.load_error(draft_model_id, cpu_mode)
+        if draft_error is not None:
+            st.sidebar.warning(f"Draft model not loaded, decoding normally: {draft_error}")
+answer_cache = get_answer_cache()
 
 # Chat history state
-if "messages" not in st.session_state:
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "messages" not in st.session_state or clear_chat:
     st.session_state.messages = []
+    # The KV and image caches belong to the model's registry slot and go away when it is evicted
+    kv_store, _ = registry.caches(model_id, cpu_mode) if worker is None else (None, None)
+    if kv_store is not None:
+        kv_store.drop(st.session_state.session_id)
+# Latency stats per assistant message, keyed by index in `messages`
+if "reply_stats" not in st.session_state or clear_chat:
+    st.session_state.reply_stats = {}
+# Which earlier turns fit into the prompt
+if "context_window" not in st.session_state or clear_chat:
+    st.session_state.context_window = ContextWindow()
+context_window = st.session_state.context_window
+context_window.budget = context_budget
+context_window.summarize = summarize_context
+
+# A reply that was interrupted (Stop button, new message, page left) never reached the
+# end of the previous run; keep what was generated so the history stays user/assistant
+if "pending_reply" in st.session_state:
+    # Its generation may still be running on a worker thread; stop it now rather than on garbage collection
+    if "cancel_event" in st.session_state:
+        st.session_state.cancel_event.set()
+    partial = st.session_state.pop("pending_reply")
+    if st.session_state.messages and st.session_state.messages[-1][0] == "user":
+        st.session_state.messages.append(("assistant", (partial + " …" if partial else "") + "⏹️ *(stopped)*"))
+
+
+def stats_caption(stats: ReplyStats) -> str:
+    """Reply stats, plus the speed-up over this session's plain (non-draft) replies for speculative ones."""
+    caption = stats.summary()
+    if stats.speculative and stats.tokens_per_sec:
+        plain = [s.tokens_per_sec for s in st.session_state.reply_stats.values()
+                 if not s.cached and not s.speculative and s.tokens_per_sec]
+        if plain:
+            caption += f" · {stats.tokens_per_sec / statistics.median(plain):.2f}× vs plain decoding"
+    return caption
+
+
+def record_partial(chunks):
+    """Pass streamed chunks through while keeping the text so far in `pending_reply`."""
+    for chunk in chunks:
+        st.session_state.pending_reply += chunk
+        yield chunk
+
 
 # Render previous conversations
-for role, content in st.session_state.messages:
+for i, (role, content) in enumerate(st.session_state.messages):
     with st.chat_message(role):
         st.markdown(content)
+        if i in st.session_state.reply_stats:
+            st.caption(stats_caption(st.session_state.reply_stats[i]))
 
 # Optional image upload
 uploaded_image = st.file_uploader("Upload Image (Optional)", type=["png", "jpg", "jpeg"])
 
 # Input field
-if user_input := st.chat_input("Type your message here..."):
+if user_input := st.chat_input(
+    "Type your message here..." if model_ready else "Waiting for the model to load...", disabled=not model_ready
+):
     # Display and save user message
     st.session_state.messages.append(("user", user_input))
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    # Model response
+    # Model response; earlier turns are sent as history so the model remembers them
+    stats = ReplyStats()
+    processor = None if worker is not None else registry.processor_for(model_id, cpu_mode)
+    # Job questions get the few best matching listings (pre-filtered by visa and place) as a system note
+    notes = []
+    if suggest_jobs and wants_jobs(user_input):
+        try:
+            with st.spinner("Looking up job listings..."):
+                retriever = get_job_retriever()
+                job_context = retriever.context(user_input) if retriever is not None else None
+            if retriever is None:
+                st.toast("Job listings are still being indexed; try again in a moment.")
+        except Exception as e:
+            job_context = None
+            st.toast(f"Job listings unavailable: {e}")
+        if job_context:
+            notes.append(job_context)
+    # Short grounded passages from the local documents, instead of relying on the weights alone
+    if use_knowledge_base:
+        try:
+            with st.spinner("Searching the knowledge base..."):
+                kb_context = get_knowledge_base().context(user_input)
+        except Exception as e:
+            kb_context = None
+            st.toast(f"Knowledge base unavailable: {e}")
+        if kb_context:
+            notes.append(kb_context)
+    # The notes count against the context budget, so older turns make room for them
+    history = context_window.build(
+        st.session_state.messages[:-1], user_input,
+        tokenizer_counter(processor) if processor is not None else approx_token_count,
+        notes=notes,
+    )
+    chat_kwargs = dict(
+        max_new_tokens=max_tokens,
+        stats=stats,
+        history=history,
+        session_id=st.session_state.session_id,
+    )
+    # Abort whatever this session was still generating and give the new reply its own flag
+    if "cancel_event" in st.session_state:
+        st.session_state.cancel_event.set()
+    cancel = st.session_state.cancel_event = threading.Event()
+    st.session_state.pending_reply = ""
+
+    cacheable = use_answer_cache and uploaded_image is None
+    cached_reply = answer_cache.get(user_input, model_id, max_tokens, history) if cacheable else None
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                reply = generate_reply(user_input, uploaded_image, processor, model, max_new_tokens=max_tokens)
-            except Exception as e:
-                reply = f"An error occurred: {e}"
+        try:
+            if cached_reply is not None:
+                reply = cached_reply
+                stats.cached = True
+                st.markdown(reply)
+            elif worker is not None:
+                with st.spinner("Thinking..."):
+                    reply = worker.generate_reply(
+                        user_input, uploaded_image, max_new_tokens=max_tokens, stats=stats,
+                        history=history,
+                    )
+                st.markdown(reply)
+            else:
+                # Clicking Stop reruns the script, which interrupts this run and cancels generation
+                st.button("⏹️ Stop", key="stop_generation")
+                use_draft = bool(draft_model_id) and uploaded_image is None and registry.is_ready(draft_model_id, cpu_mode)
+                # Pinned for the whole generation so the registry never unloads them underneath us
+                with registry.use(model_id, cpu_mode, notify=st.toast) as (processor, model), (
+                    registry.use(draft_model_id, cpu_mode) if use_draft else nullcontext((None, None))
+                ) as (_, draft_model):
+                    kv_store, image_cache = registry.caches(model_id, cpu_mode)
+                    chat_kwargs.update(kv_store=kv_store, image_cache=image_cache)
+                    if stream_output:
+                        reply = st.write_stream(record_partial(stream_reply(
+                            user_input, uploaded_image, processor, model, cancel=cancel, draft_model=draft_model,
+                            **chat_kwargs,
+                        )))
+                    else:
+                        with st.spinner("Thinking..."), GenerationTask(
+                            generate_reply, user_input, uploaded_image, processor, model, cancel=cancel,
+                            draft_model=draft_model, **chat_kwargs,
+                        ) as task:
+                            elapsed = st.empty()
+                            # Touching the page regularly lets Streamlit interrupt this run
+                            while not task.wait(0.25):
+                                elapsed.caption(f"{task.elapsed:.0f}s")
+                            elapsed.empty()
+                            reply = task.result()
+                        st.markdown(reply)
+            # A cancelled reply is cut short, so it must never be served as the answer
+            if cacheable and not stats.cached and not cancel.is_set():
+                answer_cache.put(user_input, model_id, max_tokens, reply, history)
+        except Exception as e:
+            reply = f"An error occurred: {e}"
             st.markdown(reply)
+        st.caption(stats_caption(stats))
 
+    st.session_state.reply_stats[len(st.session_state.messages)] = stats
     st.session_state.messages.append(("assistant", reply))
+    del st.session_state.pending_reply
+    if METRICS_FILE:
+        write_textfile(METRICS_FILE)
+
+cache_status.caption(f"Answer cache: {answer_cache.hits} hits · {answer_cache.misses} misses · {len(answer_cache)} entries")
+if worker is None:
+    model_status.caption("\n\n".join([
+        f"{'🟢' if state == 'ready' else '⏳'} {mid} ({mode}, {nbytes / GB:.1f} GB"
+        + (f", {refs} in use)" if refs else ")")
+        for mid, mode, state, nbytes, refs in registry.snapshot()
+    ] + [f"♻️ {message} ({age:.0f}s ago)" for age, message in registry.recent_events()]))
+if show_stage_metrics:
+    rows = STAGE_METRICS.percentiles(model_id)
+    if rows:
+        stage_panel.dataframe(
+            [{k: (round(v, 1) if isinstance(v, float) else v) for k, v in row.items() if k != "model"} for row in rows],
+            hide_index=True,
+        )
+    else:
+        stage_panel.caption("No requests timed yet for this model.")
@@ -0,0 +1 @@
+"""Headless benchmarks for the ForFore pipeline (run outside Streamlit)."""
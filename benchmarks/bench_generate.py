@@ -0,0 +1,182 @@
+"""
+Benchmark generate_reply / stream_reply without Streamlit.
+
+    python -m benchmarks.bench_generate --out bench.json
+    python -m benchmarks.bench_generate --baseline bench.json      # compare, exit 1 on regression
+
+By default a tiny random model (benchmarks/tiny_model.py) is used so the run
+needs no GPU and no network; pass --model-id to measure a real checkpoint.
+For every prompt kind (text, image) and --max-new-tokens value it reports the
+median TTFT, decode tokens/sec, preprocessing time and total time over
+--repeat runs, plus the process peak RSS once for the whole run (it only
+ever grows, so per-case values would just track the largest case so far). With --speculative the text cases
+are repeated with a draft model (--draft-model-id, or a tiny random one) and
+report the draft acceptance rate and the speed-up over plain decoding.
+"""
+import argparse
+import io
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+
+# Lower is better for these, higher is better for tokens_per_sec
+LOWER_IS_BETTER = ("ttft_s", "preprocess_s", "total_s", "peak_rss_mb")
+CASE_METRICS = ("ttft_s", "preprocess_s", "total_s", "tokens_per_sec")
+RUN_METRICS = ("peak_rss_mb",)
+PROMPT = "My D-2 visa expires next month. Which documents do I need to extend it?"
+IMAGE_PROMPT = "What does this document say about my contract period?"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_case(processor, model, image_bytes, max_new_tokens: int, repeat: int, draft_model=None) -> dict:
+    from forfore.generation import ReplyStats, build_inputs, stream_reply
+
+    text = IMAGE_PROMPT if image_bytes is not None else PROMPT
+    samples = {"ttft_s": [], "tokens_per_sec": [], "preprocess_s": [], "total_s": [], "new_tokens": []}
+    if draft_model is not None:
+        samples.update(acceptance_rate=[], tokens_per_step=[])
+    for _ in range(repeat):
+        image_file = io.BytesIO(image_bytes) if image_bytes is not None else None
+        t0 = time.perf_counter()
+        build_inputs(text, image_file, processor, model)
+        samples["preprocess_s"].append(time.perf_counter() - t0)
+
+        image_file = io.BytesIO(image_bytes) if image_bytes is not None else None
+        stats = ReplyStats()
+        for _chunk in stream_reply(text, image_file, processor, model, max_new_tokens=max_new_tokens, stats=stats,
+                                   draft_model=draft_model):
+            pass
+        samples["ttft_s"].append(stats.ttft)
+        samples["tokens_per_sec"].append(stats.tokens_per_sec or 0.0)
+        samples["total_s"].append(stats.finished_at - stats.started_at)
+        samples["new_tokens"].append(stats.new_tokens)
+        if draft_model is not None:
+            samples["acceptance_rate"].append(stats.acceptance_rate or 0.0)
+            samples["tokens_per_step"].append(stats.tokens_per_step or 0.0)
+
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def run(args) -> dict:
+    import torch
+
+    from benchmarks.tiny_model import build_tiny_draft_model, build_tiny_model, sample_image_bytes
+    from forfore.models import load_processor_and_model
+
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    t0 = time.perf_counter()
+    if args.model_id:
+        processor, model = load_processor_and_model(args.model_id, cpu_mode=args.cpu_mode, do_warmup=False)
+    else:
+        processor, model = build_tiny_model(seed=args.seed)
+    load_s = time.perf_counter() - t0
+    draft_model = None
+    if args.speculative:
+        if args.draft_model_id:
+            _, draft_model = load_processor_and_model(args.draft_model_id, cpu_mode=args.cpu_mode, do_warmup=False)
+        else:
+            draft_model = build_tiny_draft_model(getattr(processor, "tokenizer", processor), seed=args.seed + 1)
+
+    image_bytes = sample_image_bytes(seed=args.seed)
+    # One untimed pass so lazy initialization does not land in the first case
+    run_case(processor, model, None, 2, 1)
+
+    cases = {}
+    for kind, data in (("text", None), ("image", image_bytes)):
+        for max_new_tokens in args.max_new_tokens:
+            name = f"{kind}/max_new_tokens={max_new_tokens}"
+            cases[name] = run_case(processor, model, data, max_new_tokens, args.repeat)
+            print(f"{name:32s} ttft {cases[name]['ttft_s'] * 1000:8.1f} ms   "
+                  f"{cases[name]['tokens_per_sec']:8.1f} tok/s   "
+                  f"preprocess {cases[name]['preprocess_s'] * 1000:7.1f} ms", file=sys.stderr)
+
+    if draft_model is not None:
+        for max_new_tokens in args.max_new_tokens:
+            name = f"text+draft/max_new_tokens={max_new_tokens}"
+            case = cases[name] = run_case(processor, model, None, max_new_tokens, args.repeat, draft_model)
+            plain = cases[f"text/max_new_tokens={max_new_tokens}"]
+            case["speedup"] = case["tokens_per_sec"] / plain["tokens_per_sec"] if plain["tokens_per_sec"] else 0.0
+            print(f"{name:32s} ttft {case['ttft_s'] * 1000:8.1f} ms   {case['tokens_per_sec']:8.1f} tok/s   "
+                  f"accepted {case['acceptance_rate']:6.1%}   speed-up {case['speedup']:.2f}x", file=sys.stderr)
+
+    return {
+        "model": args.model_id or "tiny-random-mllama",
+        "draft_model": (args.draft_model_id or "tiny-random-llama") if draft_model is not None else None,
+        "load_s": load_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "env": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "machine": platform.machine(),
+        },
+        "cases": cases,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Print a per-metric comparison and return the regressions beyond `tolerance`."""
+    pairs = [("run", current, baseline, RUN_METRICS)] + [
+        (name, metrics, baseline.get("cases", {}).get(name), CASE_METRICS)
+        for name, metrics in current["cases"].items()
+    ]
+    regressions = []
+    for name, metrics, base, names in pairs:
+        if base is None:
+            continue
+        for metric in names:
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            flag = "REGRESSION" if worse else ""
+            print(f"{name:32s} {metric:15s} {old:12.4f} -> {new:12.4f} ({change:+7.1%}) {flag}")
+            if worse:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-id", help="Hugging Face model to benchmark instead of the tiny random model")
+    parser.add_argument("--cpu-mode", default="bfloat16", help="Weight format for --model-id on CPU")
+    parser.add_argument("--speculative", action="store_true", help="Also run text cases with a draft model")
+    parser.add_argument("--draft-model-id", help="Draft model for --speculative instead of a tiny random one")
+    parser.add_argument("--max-new-tokens", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-threads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Compare against a previous --out file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Concurrent-session load test for both Streamlit pages, without a browser.
+
+    python -m benchmarks.load_test --sessions 16 --sizes 10000 100000 1000000 --out load.json
+
+For every dataset size (synthetic listings written to Parquet) a real
+`streamlit run` server is started in a child process, and N simulated
+browser tabs talk to it over its websocket (/_stcore/stream), sending the
+same widget-state messages the frontend sends. All sessions therefore
+compete for one server process, exactly as N users would. It reports:
+
+- job store build time and direct search / filter / facet / sort latency,
+- Jobs page rerun latency percentiles (search, visa filter, paging, table
+  view, pay sort) over all sessions,
+- chatbot rerun latency percentiles for --turns questions per session,
+  answered by a stub model (canned tokens, --stub-token-ms each) or with
+  --chat-model tiny by the random Mllama model from benchmarks/tiny_model.py,
+- server resident memory added per session (Linux).
+
+Everything runs offline on CPU: retrieval uses the hashing embedder.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Optional
+
+# Offline defaults, inherited by the server process
+os.environ.setdefault("FORFORE_EMBEDDING_MODEL", "hash")
+os.environ.setdefault("FORFORE_INDEX_DIR", os.path.join(tempfile.gettempdir(), "forfore_load_index"))
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_SCRIPT = str(ROOT / "0_🤖_Chatbot.py")
+QUANTILES = (0.5, 0.95, 0.99)
+_TOTAL_RE = re.compile(r"Total ([\d,]+) Job Listings")
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of another process (Linux); None elsewhere."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:
+        return None
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    values = sorted(samples)
+    result = {f"p{int(q * 100)}_ms": values[min(len(values) - 1, int(q * len(values)))] * 1000 for q in QUANTILES}
+    result.update(mean_ms=statistics.fmean(values) * 1000, count=len(values))
+    return result
+
+
+# --------------------------
+# Chat model stubs (installed in the server process)
+# --------------------------
+class _StubModel:
+    """Just enough of a model for the registry: a name and no tensors."""
+    name_or_path = "stub-model"
+
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+
+def install_chat_model(kind: str, token_ms: float) -> None:
+    """Replace the model registry (and, for the stub, generation itself) before any page runs."""
+    from forfore import generation, registry
+
+    if kind == "tiny":
+        from benchmarks.tiny_model import build_tiny_model
+
+        def load(model_id, cpu_mode="bfloat16", progress=None, **kwargs):
+            return build_tiny_model()
+    else:
+        def load(model_id, cpu_mode="bfloat16", progress=None, **kwargs):
+            return None, _StubModel()
+
+        words = "Thank you for your question. Please bring your passport and alien registration card.".split()
+
+        def stream_reply(user_text, image_file, processor, model, max_new_tokens=256, stats=None, **kwargs):
+            stats = stats if stats is not None else generation.ReplyStats()
+            for i in range(min(max_new_tokens, 32)):
+                time.sleep(token_ms / 1000)
+                if stats.first_token_at is None:
+                    stats.first_token_at = time.perf_counter()
+                stats.new_tokens += 1
+                yield words[i % len(words)] + " "
+            stats.finished_at = time.perf_counter()
+
+        def generate_reply(*args, **kwargs):
+            kwargs.pop("cancel", None)
+            return "".join(stream_reply(*args, **kwargs))
+
+        # The page imports these names on every rerun, so patching the module is enough
+        generation.stream_reply = stream_reply
+        generation.generate_reply = generate_reply
+
+    registry._registry = registry.ModelRegistry(loader=load, estimator=lambda model_id, cpu_mode: 0)
+
+
+def serve(args) -> None:
+    """Server process: install the chat model, load it, then run the app with Streamlit's CLI."""
+    from streamlit.web import cli as stcli
+
+    from forfore.registry import get_registry
+
+    install_chat_model(args.chat_model, args.stub_token_ms)
+    # Load before any session connects so the chat runs measure replies, not the model load
+    with get_registry().use(args.model_id, "bfloat16"):
+        pass
+    sys.argv = ["streamlit", "run", APP_SCRIPT, "--server.headless=true", "--server.port", str(args.port),
+                "--browser.gatherUsageStats=false", "--server.fileWatcherType=none"]
+    sys.exit(stcli.main())
+
+
+class Server:
+    """A `--serve` child process on a free port."""
+
+    def __init__(self, args, env: dict):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.log = tempfile.NamedTemporaryFile("w+", prefix="forfore_load_server_", suffix=".log", delete=False)
+        cmd = [sys.executable, "-m", "benchmarks.load_test", "--serve", "--port", str(self.port),
+               "--chat-model", args.chat_model, "--stub-token-ms", str(args.stub_token_ms),
+               "--model-id", args.model_id]
+        self.proc = subprocess.Popen(cmd, cwd=ROOT, env=dict(os.environ, **env),
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+        self.url = f"ws://localhost:{self.port}/_stcore/stream"
+
+    def wait_healthy(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                with urllib.request.urlopen(f"http://localhost:{self.port}/_stcore/health", timeout=1.0):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"Server did not start; see {self.log.name}")
+
+    def rss_mb(self) -> Optional[float]:
+        return process_rss_mb(self.proc.pid)
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.log.close()
+
+
+# --------------------------
+# Simulated browser tab
+# --------------------------
+class Session:
+    """
+    One websocket session. Like the frontend, it keeps every widget value it
+    has set and sends them all with each rerun; buttons and the chat input
+    are triggers and only go with the rerun that fires them.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.pages: "dict[str, str]" = {}        # page name -> script hash
+        self.page_hash = ""
+        self.widgets: "dict[str, tuple]" = {}    # key (or button label) -> (widget id, element)
+        self.states: "dict[str, object]" = {}    # widget id -> WidgetState
+        self.markdown: list = []
+
+    async def __aenter__(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    def widget_id(self, name: str) -> str:
+        return self.widgets[name][0]
+
+    def element(self, name: str):
+        return self.widgets[name][1]
+
+    def set(self, name: str, **value) -> None:
+        """Set a widget's value, e.g. set("job_search", string_value="developer")."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=self.widget_id(name))
+        for field, v in value.items():
+            target = getattr(state, field)
+            if hasattr(target, "data"):
+                target.data.extend(v)
+            else:
+                setattr(state, field, v)
+        self.states[state.id] = state
+
+    async def rerun(self, timings: Optional[list] = None, **triggers) -> float:
+        """
+        Rerun the current page with the widget values set so far, plus one-off
+        triggers such as chat=("chat_input", "question") or click="Next ▶".
+        Returns the seconds until the server finished the run.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = self.page_hash
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        if "click" in triggers:
+            msg.rerun_script.widget_states.widgets.append(
+                WidgetState(id=self.widget_id(triggers["click"]), trigger_value=True)
+            )
+        if "chat" in triggers:
+            state = WidgetState(id=self.widget_id("chat_input"))
+            state.chat_input_value.data = triggers["chat"]
+            msg.rerun_script.widget_states.widgets.append(state)
+
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._read_run(), self.timeout)
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings.append(elapsed)
+        return elapsed
+
+    async def _read_run(self) -> None:
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.widgets, self.markdown = {}, []
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "navigation":
+                self.pages = {p.page_name: p.page_script_hash for p in msg.navigation.app_pages}
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype == "exception":
+                    raise RuntimeError(f"Page raised {element.exception.type}: {element.exception.message}")
+                if etype == "markdown":
+                    self.markdown.append(element.markdown.body)
+                widget = getattr(element, etype)
+                widget_id = getattr(widget, "id", "")
+                if widget_id.startswith("$$ID-"):
+                    key = widget_id.rsplit("-", 1)[1]
+                    name = key if key != "None" else (getattr(widget, "label", "") or etype)
+                    self.widgets[name] = (widget_id, widget)
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Page failed to compile")
+                if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+    async def open_page(self, name: str, timings: Optional[list] = None) -> None:
+        if not self.pages:
+            await self.rerun()
+        self.page_hash = self.pages[name]
+        self.states = {}
+        await self.rerun(timings)
+
+    def total_listings(self) -> Optional[int]:
+        for body in self.markdown:
+            match = _TOTAL_RE.search(body)
+            if match:
+                return int(match.group(1).replace(",", ""))
+        return None
+
+
+async def jobs_session(index: int, server: Server, timings: dict, plan: dict, timeout: float) -> dict:
+    totals = {}
+    async with Session(server.url, timeout) as s:
+        await s.open_page("Jobs", timings["initial"])
+        term = plan["terms"][index % len(plan["terms"])]
+        s.set("job_search", string_value=term)
+        await s.rerun(timings["search"])
+        totals["search"] = s.total_listings()
+        # A visa that really occurs among the matches, so the step times a real filter
+        s.set("job_visa", string_array_value=[plan["visas"][term][index % len(plan["visas"][term])]])
+        await s.rerun(timings["visa_filter"])
+        totals["visa_filter"] = s.total_listings()
+        s.set("job_search", string_value="")
+        await s.rerun(timings["clear_search"])
+        if "Next ▶" in s.widgets and not s.element("Next ▶").disabled:
+            await s.rerun(timings["next_page"], click="Next ▶")
+        s.set("job_view", string_value="Table")
+        await s.rerun(timings["table_view"])
+        s.set("job_sort", string_value="Highest pay")
+        await s.rerun(timings["sort_pay"])
+        totals["sort_pay"] = s.total_listings()
+    return totals
+
+
+async def chat_session(index: int, server: Server, timings: dict, turns: int, timeout: float) -> dict:
+    async with Session(server.url, timeout) as s:
+        await s.open_page("Chatbot", timings["initial"])
+        if s.element("chat_input").disabled:
+            raise RuntimeError("The chat model is not ready; replies would not be measured")
+        for turn in range(turns):
+            # Distinct questions so the answer cache does not short-circuit generation
+            await s.rerun(timings["reply"], chat=f"Session {index}, question {turn}: how do I extend my D-2 visa?")
+    return {}
+
+
+async def _gather(fn, n: int, server: Server, *args) -> "tuple[dict, list]":
+    from collections import defaultdict
+
+    timings = defaultdict(list)
+    results = await asyncio.gather(*(fn(i, server, timings, *args) for i in range(n)))
+    return timings, results
+
+
+def run_sessions(fn, n: int, server: Server, *args) -> "tuple[dict, list, Optional[float]]":
+    """Run `n` concurrent sessions; returns (timings by step, per-session results, server MB added per session)."""
+    rss_before = server.rss_mb()
+    timings, results = asyncio.run(_gather(fn, n, server, *args))
+    rss_after = server.rss_mb()
+    per_session = (rss_after - rss_before) / n if rss_before is not None and rss_after is not None else None
+    return timings, results, per_session
+
+
+# --------------------------
+# Direct (no Streamlit) job index timings
+# --------------------------
+def direct_job_timings(snapshot, repeat: int = 20) -> dict:
+    import numpy as np
+
+    facets, search, df = snapshot.facets, snapshot.search, snapshot.df
+    visa = facets.values["visa"][0]
+    location = facets.values["location"][0]
+    cases = {
+        "search": lambda: search.search("warehouse packing"),
+        "search_prefix": lambda: search.search("dev"),
+        "filter_mask": lambda: facets.mask({"visa": [visa], "location": location}),
+        "facet_counts": lambda: [facets.counts(c, {"visa": [visa]}) for c in ("location", "category", "type", "visa")],
+        "sort_pay": lambda: (lambda m, o: o[m[o]])(facets.mask({"visa": [visa]}), snapshot.orders["Highest pay"]),
+        "page_rows": lambda: df.iloc[np.flatnonzero(facets.mask({"visa": [visa]}))[:25]],
+    }
+    result = {}
+    for name, fn in cases.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        result[name] = percentiles(samples)
+    return result
+
+
+def session_plan(snapshot, terms=("developer", "warehouse")) -> dict:
+    """Search terms and, per term, the three visas with the most matching listings."""
+    facets = snapshot.facets
+    visas = {}
+    for term in terms:
+        matches = snapshot.search.search(term)
+        counts = facets.counts("visa", {"visa": []}, facets.rows_bits(matches))
+        counts.pop("All")
+        visas[term] = [v for v, n in sorted(counts.items(), key=lambda item: -item[1]) if n][:3]
+    return {"terms": list(terms), "visas": visas}
+
+
+def run_jobs(size: int, args) -> dict:
+    from benchmarks.synthetic_jobs import synthetic_jobs
+    from forfore import job_data
+
+    path = os.path.join(tempfile.gettempdir(), f"forfore_jobs_{size}_{args.seed}.parquet")
+    if not os.path.exists(path):
+        synthetic_jobs(size, seed=args.seed).to_parquet(path)
+    start = time.perf_counter()
+    snapshot = job_data.JobStore(job_data.ParquetJobSource(path), refresh_interval=3600).snapshot
+    build_s = time.perf_counter() - start
+    plan = session_plan(snapshot)
+
+    server = Server(args, {"FORFORE_JOBS_PARQUET": path, "FORFORE_JOBS_REFRESH_SECONDS": "3600"})
+    try:
+        server.wait_healthy(args.timeout)
+        # One warm-up visit builds the server's job store before sessions are measured
+        warmup, _, _ = run_sessions(jobs_session, 1, server, plan, args.timeout)
+        timings, totals, rss_per_session = run_sessions(jobs_session, args.sessions, server, plan, args.timeout)
+    finally:
+        server.stop()
+    empty = [t for t in totals if not t.get("visa_filter")]
+    if empty:
+        raise RuntimeError(f"{len(empty)} sessions got no listings for a visa that has matches: {empty[0]}")
+
+    result = {
+        "rows": size,
+        "store_build_s": build_s,
+        "server_first_visit_s": warmup["initial"][0],
+        "direct": direct_job_timings(snapshot),
+        "reruns": {step: percentiles(samples) for step, samples in timings.items()},
+        "listings": totals,
+        "rss_per_session_mb": rss_per_session,
+    }
+    print(f"jobs {size:>9,} rows: build {build_s:6.1f}s  "
+          f"search p95 {result['reruns']['search'].get('p95_ms', 0):7.1f} ms  "
+          f"direct search p95 {result['direct']['search']['p95_ms']:6.2f} ms  "
+          f"{rss_per_session or 0:6.1f} MB/session", file=sys.stderr)
+    return result
+
+
+def run_chat(args) -> dict:
+    server = Server(args, {})
+    try:
+        server.wait_healthy(args.timeout)
+        timings, _, rss_per_session = run_sessions(chat_session, args.sessions, server, args.turns, args.timeout)
+    finally:
+        server.stop()
+    result = {
+        "model": args.chat_model,
+        "reruns": {step: percentiles(samples) for step, samples in timings.items()},
+        "rss_per_session_mb": rss_per_session,
+    }
+    print(f"chat ({args.chat_model}): reply p50 {result['reruns']['reply'].get('p50_ms', 0):7.1f} ms  "
+          f"p95 {result['reruns']['reply'].get('p95_ms', 0):7.1f} ms  {rss_per_session or 0:6.1f} MB/session",
+          file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent simulated sessions")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Synthetic job counts")
+    parser.add_argument("--turns", type=int, default=3, help="Chat questions per session")
+    parser.add_argument("--chat-model", choices=["stub", "tiny"], default="stub")
+    parser.add_argument("--stub-token-ms", type=float, default=5.0, help="Per-token delay of the stub model")
+    parser.add_argument("--model-id", default="unsloth/Llama-3.2-11B-Vision-Instruct",
+                        help="Model id the chatbot page asks for (served by the stub/tiny model)")
+    parser.add_argument("--skip-jobs", action="store_true")
+    parser.add_argument("--skip-chat", action="store_true")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds allowed per rerun")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this file (default: stdout)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8501, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results = {"sessions": args.sessions, "jobs": [], "chat": None}
+    if not args.skip_jobs:
+        results["jobs"] = [run_jobs(size, args) for size in args.sizes]
+    if not args.skip_chat:
+        results["chat"] = run_chat(args)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Synthetic job boards of any size for load tests.
+
+Rows are drawn from the sample listings' vocabulary (titles, companies,
+salary wording, visa combinations) plus generated districts and filler
+sentences, so search, facets and salary parsing see realistic data.
+Generation is vectorized; a million rows take a few seconds.
+"""
+import numpy as np
+import pandas as pd
+
+from forfore.job_data import COLUMNS, SAMPLE_JOBS
+
+CITIES = ["Seoul", "Busan", "Incheon", "Daegu", "Daejeon", "Gwangju", "Suwon", "Ulsan", "Changwon", "Cheonan",
+          "Gimpo", "Bucheon", "Ansan", "Hwaseong", "Pyeongtaek", "Jeonju", "Cheongju", "Pohang", "Gimhae", "Jeju"]
+DISTRICTS = ["Gangnam-gu", "Jung-gu", "Nam-gu", "Buk-gu", "Seo-gu", "Dong-gu", "Mapo-gu", "Jongno-gu",
+             "Haeundae-gu", "Namdong-gu", "Yeongtong-gu", "Danwon-gu", "Gyeonggi-do", "Seongsan-gu"]
+SENTENCES = [
+    "Training is provided for new staff.", "Dormitory and meals available.", "Shift work including weekends.",
+    "Korean language classes supported by the company.", "Overtime is paid at 1.5x the hourly rate.",
+    "Experience with customers is preferred.", "Work with an international team.",
+    "Four major insurances provided.", "Transportation allowance included.", "외국인 근로자 환영합니다.",
+    "기숙사 제공, 초보 가능.", "주 5일 근무, 야간 수당 지급.",
+]
+
+
+def synthetic_jobs(n: int, seed: int = 0) -> pd.DataFrame:
+    """`n` listings with the forfore.job_data.COLUMNS schema."""
+    if n == 0:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in COLUMNS.items()})
+    rng = np.random.default_rng(seed)
+    samples = pd.DataFrame(SAMPLE_JOBS)
+    pick = rng.integers(0, len(samples), size=n)
+    base = samples.iloc[pick].reset_index(drop=True)
+
+    cities = np.array(CITIES)[rng.integers(0, len(CITIES), size=n)]
+    districts = np.array(DISTRICTS)[rng.integers(0, len(DISTRICTS), size=n)]
+    sentences = np.array(SENTENCES)
+    extra = pd.Series(sentences[rng.integers(0, len(sentences), size=n)])
+    now = pd.Timestamp.now().floor("s")
+    posted = now - pd.to_timedelta(rng.integers(0, 60 * 24 * 3600, size=n), unit="s")
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1, dtype=np.int64),
+        "title": base["title"],
+        "company": base["company"] + pd.Series(rng.integers(1, 500, size=n)).map(lambda i: f" #{i}"),
+        "location": pd.Series(cities) + ", " + pd.Series(districts),
+        "salary": base["salary"],
+        "type": base["type"],
+        "visa": base["visa"],
+        "description": base["description"] + " " + extra,
+        "requirements": base["requirements"],
+        "posted": posted,
+        "category": base["category"],
+        "updated_at": posted,
+    })
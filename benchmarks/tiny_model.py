@@ -0,0 +1,159 @@
+"""
+A tiny, randomly initialized Llama-3.2-Vision (Mllama) model and processor.
+
+Everything is built in memory: a byte-level tokenizer, a small image
+processor and a few-layer model. Benchmarks and load tests can therefore
+exercise the real generate_reply code path on a CPU-only box without
+network access. The output is gibberish; only the timings matter.
+"""
+import io
+
+SPECIAL_TOKENS = [
+    "<|begin_of_text|>", "<|end_of_text|>", "<|start_header_id|>", "<|end_header_id|>",
+    "<|eot_id|>", "<|image|>", "<|python_tag|>", "<|finetune_right_pad_id|>",
+]
+IMAGE_SIZE = 56
+MAX_TILES = 2
+
+CHAT_TEMPLATE = (
+    "{{ bos_token }}"
+    # Same restriction as the Llama-3.2-Vision template
+    "{% set ns = namespace(images=false) %}"
+    "{% for message in messages %}{% if message['content'] is not string %}{% for part in message['content'] %}"
+    "{% if part['type'] == 'image' %}{% set ns.images = true %}{% endif %}"
+    "{% endfor %}{% endif %}{% endfor %}"
+    "{% if ns.images and messages[0]['role'] == 'system' %}"
+    "{{ raise_exception('Prompting with images is incompatible with system messages.') }}{% endif %}"
+    "{% for message in messages %}"
+    "<|start_header_id|>{{ message['role'] }}<|end_header_id|>\n\n"
+    "{% if message['content'] is string %}{{ message['content'] }}"
+    "{% else %}{% for part in message['content'] %}"
+    "{% if part['type'] == 'image' %}<|image|>{% else %}{{ part['text'] }}{% endif %}"
+    "{% endfor %}{% endif %}<|eot_id|>"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}<|start_header_id|>assistant<|end_header_id|>\n\n{% endif %}"
+)
+
+
+def build_tokenizer():
+    """Byte-level tokenizer: one token per UTF-8 byte plus the Llama 3 special tokens."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    alphabet = pre_tokenizers.ByteLevel.alphabet()
+    vocab = {ch: i for i, ch in enumerate(sorted(alphabet))}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False, use_regex=False)
+    backend.decoder = decoders.ByteLevel()
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        bos_token="<|begin_of_text|>",
+        eos_token="<|eot_id|>",
+        pad_token="<|finetune_right_pad_id|>",
+        additional_special_tokens=[t for t in SPECIAL_TOKENS if t not in
+                                   ("<|begin_of_text|>", "<|eot_id|>", "<|finetune_right_pad_id|>")],
+        # Like the Llama 3 tokenizer: no token_type_ids, which generate() rejects
+        model_input_names=["input_ids", "attention_mask"],
+    )
+    tokenizer.chat_template = CHAT_TEMPLATE
+    return tokenizer
+
+
+def supported_aspect_ratios(max_tiles: int) -> list:
+    """(width, height) tile layouts with at most `max_tiles` tiles, in the image processor's order."""
+    return [[w, h] for w in range(1, max_tiles + 1) for h in range(1, max_tiles + 1) if w * h <= max_tiles]
+
+
+def build_tiny_model(seed: int = 0):
+    """Return (processor, model) for a ~1M parameter Mllama model on CPU."""
+    import torch
+    from transformers import (
+        MllamaConfig,
+        MllamaForConditionalGeneration,
+        MllamaImageProcessor,
+        MllamaProcessor,
+    )
+    from transformers.models.mllama.configuration_mllama import MllamaTextConfig, MllamaVisionConfig
+
+    tokenizer = build_tokenizer()
+    image_processor = MllamaImageProcessor(size={"height": IMAGE_SIZE, "width": IMAGE_SIZE}, max_image_tiles=MAX_TILES)
+    processor = MllamaProcessor(image_processor=image_processor, tokenizer=tokenizer)
+    processor.chat_template = CHAT_TEMPLATE   # not a constructor argument before transformers 4.47
+
+    vision_hidden = 32
+    config = MllamaConfig(
+        vision_config=MllamaVisionConfig(
+            hidden_size=vision_hidden,
+            intermediate_size=64,
+            num_hidden_layers=2,
+            num_global_layers=1,
+            attention_heads=2,
+            image_size=IMAGE_SIZE,
+            patch_size=14,
+            max_num_tiles=MAX_TILES,
+            # The default list is for 4 tiles; these are the layouts the image processor uses for MAX_TILES
+            supported_aspect_ratios=supported_aspect_ratios(MAX_TILES),
+            intermediate_layers_indices=[0],
+            vision_output_dim=vision_hidden * 2,
+        ).to_dict(),
+        text_config=MllamaTextConfig(
+            vocab_size=len(tokenizer),
+            hidden_size=64,
+            intermediate_size=128,
+            num_hidden_layers=4,
+            num_attention_heads=4,
+            num_key_value_heads=2,
+            cross_attention_layers=[1],
+            max_position_embeddings=4096,
+            # The text model reads rope_type from here and the config has no default
+            rope_scaling={"rope_type": "default"},
+            bos_token_id=tokenizer.bos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
+        ).to_dict(),
+        image_token_index=processor.image_token_id,
+    )
+
+    torch.manual_seed(seed)
+    model = MllamaForConditionalGeneration(config).eval()
+    # Random weights rarely emit EOS, but make sure every run decodes exactly max_new_tokens
+    model.generation_config.eos_token_id = None
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    return processor, model
+
+
+def build_tiny_draft_model(tokenizer, seed: int = 1):
+    """A text-only Llama with the same tokenizer, for speculative decoding runs."""
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        num_key_value_heads=1,
+        max_position_embeddings=4096,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    torch.manual_seed(seed)
+    model = LlamaForCausalLM(config).eval()
+    model.generation_config.eos_token_id = None
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    return model
+
+
+def sample_image_bytes(width: int = 1600, height: int = 1200, seed: int = 0) -> bytes:
+    """A deterministic noisy JPEG, roughly like a phone photo of a document."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
@@ -0,0 +1 @@
+"""Shared building blocks for the ForFore Streamlit pages."""
@@ -0,0 +1,103 @@
+"""Cache of finished answers for repeated text-only questions."""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+_PUNCT_RE = re.compile(r"[\s?!.。？！]+$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, width and spacing so "What is an ARC?" matches "what is an arc"."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _SPACE_RE.sub(" ", text).strip()
+    return _PUNCT_RE.sub("", text)
+
+
+def _key(text: str, model_id: str, max_new_tokens: int, history) -> str:
+    payload = json.dumps([text, model_id, max_new_tokens, [list(m) for m in history]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache in front of generate_reply, keyed by prompt, model id,
+    max_new_tokens and the preceding history. A lookup tries the exact text
+    first, then its normalized form. With `db_path`, entries are also written
+    to SQLite so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (answer, created)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created REAL)")
+            self._db.execute("DELETE FROM answers WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, text: str, model_id: str, max_new_tokens: int, history) -> list:
+        exact = _key(text, model_id, max_new_tokens, history)
+        normalized = _key(
+            normalize_text(text), model_id, max_new_tokens, [(role, normalize_text(c)) for role, c in history]
+        )
+        return [exact] if exact == normalized else [exact, normalized]
+
+    def _lookup(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = self._entries[key] = tuple(row)
+                self._trim()
+        if entry is None:
+            return None
+        if now - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, text: str, model_id: str, max_new_tokens: int, history=()) -> Optional[str]:
+        with self._lock:
+            for key in self._keys(text, model_id, max_new_tokens, history):
+                answer = self._lookup(key)
+                if answer is not None:
+                    self.hits += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model_id: str, max_new_tokens: int, answer: str, history=()) -> None:
+        created = time.time()
+        with self._lock:
+            keys = self._keys(text, model_id, max_new_tokens, history)
+            for key in keys:
+                self._entries[key] = (answer, created)
+                self._entries.move_to_end(key)
+            self._trim()
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO answers (key, answer, created) VALUES (?, ?, ?)",
+                    [(key, answer, created) for key in keys],
+                )
+                self._db.commit()
@@ -0,0 +1,104 @@
+"""Keeps the chat history sent to the model within a token budget."""
+import re
+from typing import Callable, Optional, Sequence
+
+# Chat-template tokens around every message (header, role, end-of-turn) for Llama 3
+MESSAGE_OVERHEAD = 5
+_SENTENCE_RE = re.compile(r"(?<=[.?!。？！])\s")
+
+
+def approx_token_count(text: str) -> int:
+    """Tokenizer-free estimate (~4 characters per token) for when no tokenizer is loaded."""
+    return len(text) // 4 + 1
+
+
+def tokenizer_counter(processor) -> Callable[[str], int]:
+    tokenizer = getattr(processor, "tokenizer", processor)
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    sentence = _SENTENCE_RE.split(text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "…"
+
+
+class ContextWindow:
+    """
+    Chooses which earlier turns of one session go into the prompt.
+
+    Token counts are cached per message, so each turn only tokenizes the new
+    text. When the history exceeds `budget` tokens, the window start moves
+    forward until it is back under `low_watermark * budget`; sliding in
+    chunks keeps the prompt prefix, and with it the session KV cache, stable
+    for several turns. With `summarize`, the dropped user questions are
+    folded into a short system note so the model keeps the gist of them.
+    """
+
+    def __init__(self, budget: int = 2048, summarize: bool = True, summary_budget: int = 128,
+                 low_watermark: float = 0.75):
+        self.budget = budget
+        self.summarize = summarize
+        self.summary_budget = summary_budget
+        self.low_watermark = low_watermark
+        self._start = 0
+        self._counts: "dict[str, int]" = {}
+
+    def reset(self) -> None:
+        self._start = 0
+
+    def _count(self, text: str, count_tokens: Callable[[str], int]) -> int:
+        n = self._counts.get(text)
+        if n is None:
+            n = self._counts[text] = count_tokens(text) + MESSAGE_OVERHEAD
+        return n
+
+    def _summary(self, dropped: list, count_tokens: Callable[[str], int]) -> Optional[str]:
+        """Most recent dropped questions first, until the summary budget is used up."""
+        header = "Earlier in this conversation the user asked about: "
+        used = self._count(header, count_tokens)
+        topics = []
+        for role, content in reversed(dropped):
+            if role != "user":
+                continue
+            topic = _first_sentence(content)
+            cost = self._count(topic, count_tokens) - MESSAGE_OVERHEAD + 1
+            if used + cost > self.summary_budget:
+                break
+            topics.append(topic)
+            used += cost
+        if not topics:
+            return None
+        return header + "; ".join(reversed(topics))
+
+    def build(self, history: list, user_text: str, count_tokens: Callable[[str], int] = approx_token_count,
+              notes: Sequence[str] = ()) -> list:
+        """
+        Return the (role, content) turns to send before `user_text`. `notes`
+        (retrieved listings, passages) are appended as system turns and count
+        against the budget, so the history shrinks to make room for them.
+        """
+        if self._start > len(history):
+            self._start = 0
+        available = self.budget - self._count(user_text, count_tokens)
+        # Notes change with every question, so they are counted without filling the cache
+        available -= sum(count_tokens(note) + MESSAGE_OVERHEAD for note in notes)
+        if self.summarize:
+            available -= self.summary_budget
+
+        total = sum(self._count(content, count_tokens) for _, content in history[self._start:])
+        if total > available:
+            target = available * self.low_watermark
+            while self._start < len(history) and total > target:
+                total -= self._count(history[self._start][1], count_tokens)
+                self._start += 1
+            # Start the window on a user turn so question and answer stay together
+            while self._start < len(history) and history[self._start][0] != "user":
+                total -= self._count(history[self._start][1], count_tokens)
+                self._start += 1
+
+        window = list(history[self._start:])
+        if self.summarize and self._start > 0:
+            summary = self._summary(history[:self._start], count_tokens)
+            if summary:
+                window.insert(0, ("system", summary))
+        return window + [("system", note) for note in notes]
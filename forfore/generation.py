@@ -0,0 +1,421 @@
+"""
+Prompt building and text generation for the ForFore chatbot.
+
+torch, transformers and PIL are imported inside the functions that need them,
+so importing this module (and rendering a page) does not load them.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache
+from threading import Event, Thread, get_ident
+from typing import Callable, Iterator, Optional
+
+from forfore.image_cache import ImageFeatureCache, read_image_bytes
+from forfore.images import load_image, processor_limits
+from forfore.kv_cache import SessionKVCache, new_cache
+from forfore.metrics import STAGE_METRICS, model_label, timed
+
+
+@dataclass
+class ReplyStats:
+    """Latency numbers for a single reply."""
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    new_tokens: int = 0
+    cached: bool = False
+    # Speculative decoding: tokens proposed by the draft model and main-model verification passes
+    draft_tokens: int = 0
+    verify_steps: int = 0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from request start to the first generated token."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """Decode throughput, measured after the first token."""
+        if self.first_token_at is None or self.finished_at is None or self.new_tokens < 2:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return (self.new_tokens - 1) / elapsed if elapsed > 0 else None
+
+    @property
+    def speculative(self) -> bool:
+        return self.draft_tokens > 0
+
+    @property
+    def acceptance_rate(self) -> Optional[float]:
+        """Share of draft tokens the main model accepted; every verification pass adds one token of its own."""
+        if not self.draft_tokens:
+            return None
+        accepted = max(0, self.new_tokens - self.verify_steps)
+        return min(1.0, accepted / self.draft_tokens)
+
+    @property
+    def tokens_per_step(self) -> Optional[float]:
+        """New tokens per main-model forward pass; 1.0 without speculation."""
+        if not self.verify_steps:
+            return None
+        return self.new_tokens / self.verify_steps
+
+    def summary(self) -> str:
+        if self.cached:
+            return "⚡ Cached answer"
+        parts = []
+        if self.ttft is not None:
+            parts.append(f"TTFT {self.ttft:.2f}s")
+        if self.tokens_per_sec is not None:
+            parts.append(f"{self.tokens_per_sec:.1f} tok/s")
+        parts.append(f"{self.new_tokens} tokens")
+        if self.speculative:
+            parts.append(f"draft {self.acceptance_rate:.0%} accepted, {self.tokens_per_step:.1f} tok/step")
+        return " · ".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _timed_streamer_class():
+    from transformers import TextIteratorStreamer
+
+    class _TimedStreamer(TextIteratorStreamer):
+        """TextIteratorStreamer that also records first-token time and token count."""
+
+        def __init__(self, tokenizer, stats: ReplyStats, **kwargs):
+            super().__init__(tokenizer, **kwargs)
+            self.stats = stats
+
+        def put(self, value):
+            if not self.next_tokens_are_prompt:
+                if self.stats.first_token_at is None:
+                    self.stats.first_token_at = time.perf_counter()
+                self.stats.new_tokens += value.numel()
+            super().put(value)
+
+    return _TimedStreamer
+
+
+@lru_cache(maxsize=None)
+def _cancel_criteria_class():
+    from transformers import StoppingCriteria
+
+    class _CancelCriteria(StoppingCriteria):
+        """Stops generate() at the next token once the session's cancel flag is set."""
+
+        def __init__(self, cancel: Event):
+            self.cancel = cancel
+
+        def __call__(self, input_ids, scores, **kwargs):
+            import torch
+
+            return torch.full((input_ids.shape[0],), self.cancel.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return _CancelCriteria
+
+
+def _stopping_criteria(cancel: Optional[Event]):
+    if cancel is None:
+        return None
+    from transformers import StoppingCriteriaList
+
+    return StoppingCriteriaList([_cancel_criteria_class()(cancel)])
+
+
+@contextmanager
+def _count_speculation(model, draft_model, stats: ReplyStats):
+    """
+    Count forward passes made by the calling thread: each draft pass proposes
+    one token, each main-model pass verifies a batch of them. Other sessions
+    sharing the models run on other threads and are not counted.
+    """
+    thread = get_ident()
+
+    def _counter(attr):
+        def hook(module, args, output):
+            if get_ident() == thread:
+                setattr(stats, attr, getattr(stats, attr) + 1)
+        return hook
+
+    handles = [
+        model.register_forward_hook(_counter("verify_steps")),
+        draft_model.register_forward_hook(_counter("draft_tokens")),
+    ]
+    try:
+        yield
+    finally:
+        for handle in handles:
+            handle.remove()
+
+
+def _speculation(inputs, model, draft_model, stats: ReplyStats):
+    """
+    generate() kwargs and a forward-pass counter for assisted decoding with
+    `draft_model`. The draft is text-only, so image turns decode normally.
+    """
+    if draft_model is None or "pixel_values" in inputs:
+        return {}, nullcontext()
+    return {"assistant_model": draft_model}, _count_speculation(model, draft_model, stats)
+
+
+def _generate_cache(past, assist: dict):
+    """`past`, or with assisted decoding a fresh cache that survives its crops (see kv_cache.new_cache)."""
+    return past if past is not None or not assist else new_cache()
+
+
+class GenerationTask:
+    """
+    Runs `fn(*args, **kwargs)` on a background thread so the caller can keep
+    polling (and be interrupted) while it works. Leaving the `with` block
+    before the task finished sets `cancel`, which stops generation at the next
+    token instead of after max_new_tokens.
+    """
+
+    def __init__(self, fn: Callable, *args, cancel: Event, **kwargs):
+        self.cancel = cancel
+        self.started = time.perf_counter()
+        self._result = None
+        self._error: Optional[BaseException] = None
+        self._thread = Thread(target=self._run, args=(fn, args, dict(kwargs, cancel=cancel)), daemon=True)
+        self._thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self._result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._error = e
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def wait(self, timeout: float) -> bool:
+        """True once the task has finished."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def result(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread.is_alive():
+            self.cancel.set()
+        return False
+
+
+def build_messages(user_text: str, has_image: bool, history=()) -> list:
+    """
+    Turn the (role, content) chat history plus the new user turn into
+    chat-template messages. Earlier turns are text only; the image, if any,
+    belongs to the current question.
+
+    System notes (history summary, job listings, knowledge passages) are
+    plain strings, which is what the Llama 3 templates expect for the system
+    slot. The Llama-3.2-Vision template refuses system messages when an image
+    is attached, so on image turns the notes are folded into the question.
+    """
+    notes = [content for role, content in history if role == "system"] if has_image else []
+    messages = [
+        {"role": role, "content": content if role == "system" else [{"type": "text", "text": content}]}
+        for role, content in history
+        if not (has_image and role == "system")
+    ]
+    if notes:
+        user_text = "\n\n".join(notes + [user_text])
+    content = [{"type": "text", "text": user_text}]   # ← User question
+    if has_image:
+        content.insert(0, {"type": "image"})          # ← Image token
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def _image_features(data: bytes, processor) -> dict:
+    """Run only the image half of the processor (decode, resize, normalize, tile)."""
+    image = load_image(data, *processor_limits(processor))
+    return dict(processor.image_processor(images=[[image]], return_tensors="pt"))
+
+
+def _inputs_from_features(prompt: str, features: dict, processor):
+    """
+    Same result as processor(text=prompt, images=[image]) for Llama-3.2-Vision,
+    but reusing already computed image features.
+    """
+    from transformers import BatchFeature
+    from transformers.models.mllama.processing_mllama import (
+        convert_sparse_cross_attention_mask_to_dense,
+        get_cross_attention_token_mask,
+    )
+
+    # A batch of one, as MllamaProcessor.__call__ tokenizes it: input_ids is a list of id lists
+    encoding = processor.tokenizer([prompt], padding=True)
+    token_mask = [get_cross_attention_token_mask(ids, processor.image_token_id) for ids in encoding["input_ids"]]
+    data = dict(encoding)
+    data.update({k: v for k, v in features.items() if k != "num_tiles"})
+    data["cross_attention_mask"] = convert_sparse_cross_attention_mask_to_dense(
+        token_mask,
+        num_tiles=features["num_tiles"],
+        max_num_tiles=processor.image_processor.max_image_tiles,
+        length=max(len(ids) for ids in encoding["input_ids"]),
+    )
+    return BatchFeature(data=data, tensor_type="pt")
+
+
+def build_inputs(user_text: str, image_file, processor, model, history=(),
+                 image_cache: Optional[ImageFeatureCache] = None):
+    """
+    Llama-3.2-Vision requires a chat template.
+    When an image is present, create a prompt with {"type": "image"} token,
+    then pass it as processor(text=prompt, images=[...]).
+    With an `image_cache`, the image features are looked up by content hash
+    so follow-up questions about the same upload skip preprocessing.
+    """
+    label = model_label(model)
+    messages = build_messages(user_text, image_file is not None, history)
+    with timed("chat_template", label):
+        prompt = processor.apply_chat_template(
+            messages, add_generation_prompt=True
+        )
+
+    if image_file is not None and image_cache is not None and hasattr(processor, "image_token_id"):
+        def _compute(data):
+            with timed("image_preprocess", label):
+                return _image_features(data, processor)
+
+        features = image_cache.get_or_compute(read_image_bytes(image_file), _compute)
+        with timed("processor", label):
+            inputs = _inputs_from_features(prompt, features, processor)
+    elif image_file is not None:
+        with timed("image_decode", label):
+            image = load_image(read_image_bytes(image_file), *processor_limits(processor))
+        with timed("processor", label):
+            inputs = processor(
+                text=prompt,
+                images=[image],      # Pass as list
+                return_tensors="pt",
+                padding=True
+            )
+    else:
+        with timed("processor", label):
+            inputs = processor(
+                text=prompt,
+                return_tensors="pt",
+                padding=True
+            )
+
+    with timed("to_device", label):
+        return inputs.to(model.device)
+
+
+def _checkout_cache(inputs, image_file, kv_store: Optional[SessionKVCache], session_id: Optional[str]):
+    """
+    Reuse the session's KV cache for text-only turns. Image turns always run a
+    full prefill: the vision cross-attention states cannot be extended in place.
+    """
+    if kv_store is None or session_id is None:
+        return None
+    if image_file is not None:
+        kv_store.drop(session_id)
+        return None
+    return kv_store.checkout(session_id, inputs["input_ids"])
+
+
+def generate_reply(user_text: str, image_file, processor, model, max_new_tokens: int = 256,
+                   stats: Optional[ReplyStats] = None, history=(),
+                   kv_store: Optional[SessionKVCache] = None, session_id: Optional[str] = None,
+                   image_cache: Optional[ImageFeatureCache] = None, cancel: Optional[Event] = None,
+                   draft_model=None) -> str:
+    """
+    Generate the whole reply in one call and return it once decoding finishes.
+    Setting `cancel` from another thread stops generation at the next token.
+    With `draft_model` (same tokenizer), text-only turns use assisted decoding.
+    """
+    import torch
+
+    stats = stats if stats is not None else ReplyStats()
+    inputs = build_inputs(user_text, image_file, processor, model, history, image_cache)
+    past = _checkout_cache(inputs, image_file, kv_store, session_id)
+    assist, counting = _speculation(inputs, model, draft_model, stats)
+
+    label = model_label(model)
+    with timed("generate", label), torch.no_grad(), counting:
+        out_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, past_key_values=_generate_cache(past, assist),
+                                 stopping_criteria=_stopping_criteria(cancel), **assist)
+    if past is not None:
+        kv_store.checkin(session_id, out_ids, past)
+
+    # Drop the prompt so the reply matches what the streaming path shows
+    new_ids = out_ids[:, inputs["input_ids"].shape[1]:]
+    stats.first_token_at = stats.finished_at = time.perf_counter()
+    stats.new_tokens = new_ids.shape[1]
+    with timed("batch_decode", label):
+        return processor.batch_decode(new_ids, skip_special_tokens=True)[0].strip()
+
+
+def stream_reply(user_text: str, image_file, processor, model, max_new_tokens: int = 256,
+                 stats: Optional[ReplyStats] = None, history=(),
+                 kv_store: Optional[SessionKVCache] = None, session_id: Optional[str] = None,
+                 image_cache: Optional[ImageFeatureCache] = None, cancel: Optional[Event] = None,
+                 draft_model=None) -> Iterator[str]:
+    """
+    Yield the reply as decoded text chunks while the model is still generating.
+    `model.generate` runs on a helper thread and feeds a TextIteratorStreamer,
+    so the first chunk arrives after prefill instead of after the full answer.
+    If the consumer stops early (Streamlit rerun, closed session) or `cancel`
+    is set, generation stops at the next token. `draft_model` works as in
+    `generate_reply`.
+    """
+    import torch
+
+    stats = stats if stats is not None else ReplyStats()
+    inputs = build_inputs(user_text, image_file, processor, model, history, image_cache)
+    past = _checkout_cache(inputs, image_file, kv_store, session_id)
+    tokenizer = getattr(processor, "tokenizer", processor)
+    streamer = _timed_streamer_class()(tokenizer, stats, skip_prompt=True, skip_special_tokens=True)
+    cancel = cancel if cancel is not None else Event()
+    assist, counting = _speculation(inputs, model, draft_model, stats)
+    errors = []
+
+    def _run():
+        try:
+            with torch.no_grad(), counting:
+                out_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, streamer=streamer,
+                                         past_key_values=_generate_cache(past, assist),
+                                         stopping_criteria=_stopping_criteria(cancel),
+                                         **assist)
+            if past is not None:
+                kv_store.checkin(session_id, out_ids, past)
+        except Exception as e:  # surfaced to the caller after the stream ends
+            errors.append(e)
+            streamer.end()
+
+    thread = Thread(target=_run, daemon=True)
+    generate_started = time.perf_counter()
+    thread.start()
+    finished = False
+    try:
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        finished = True
+    finally:
+        if not finished:
+            cancel.set()
+        thread.join()
+        stats.finished_at = time.perf_counter()
+        # Prefill ends with the first token; the rest is decoding (incl. incremental detokenizing)
+        label = model_label(model)
+        STAGE_METRICS.observe("generate", label, stats.finished_at - generate_started)
+        if stats.first_token_at is not None:
+            STAGE_METRICS.observe("prefill", label, stats.first_token_at - generate_started)
+            STAGE_METRICS.observe("decode", label, stats.finished_at - stats.first_token_at)
+
+    if errors:
+        raise errors[0]
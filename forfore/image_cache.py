@@ -0,0 +1,67 @@
+"""Content-addressed LRU cache for preprocessed image features."""
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Tuple
+
+
+def read_image_bytes(image_file) -> bytes:
+    """Raw bytes of an uploaded file, a path, or an open binary file."""
+    if isinstance(image_file, (bytes, bytearray)):
+        return bytes(image_file)
+    if isinstance(image_file, (str, Path)):
+        return Path(image_file).read_bytes()
+    if hasattr(image_file, "getvalue"):      # Streamlit UploadedFile / BytesIO
+        return image_file.getvalue()
+    image_file.seek(0)
+    return image_file.read()
+
+
+def _nbytes(features: dict) -> int:
+    return sum(v.numel() * v.element_size() for v in features.values() if hasattr(v, "element_size"))
+
+
+class ImageFeatureCache:
+    """
+    Maps the SHA-256 of an image file to the processor outputs computed for it
+    (pixel_values, aspect-ratio ids/masks, tile counts). Entries are evicted in
+    LRU order once their tensors take more than `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024**2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[dict, int]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, data: bytes, compute: Callable[[bytes], dict]) -> dict:
+        """Return cached features for `data`, running `compute(data)` on a miss."""
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        features = compute(data)
+        size = _nbytes(features)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (features, size)
+                self._total += size
+                while self._total > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._total -= evicted
+        return features
@@ -0,0 +1,72 @@
+"""
+Image ingestion for uploads: decode only as many pixels as the model will see.
+
+Phone photos are 12-48 MP while Llama-3.2-Vision consumes at most
+max_image_tiles tiles of 560x560. `load_image` reads the header first,
+rejects oversized files before decoding, lets libjpeg decode at 1/2, 1/4 or
+1/8 scale (draft mode), applies the EXIF orientation and finally resizes to
+the processor's pixel budget.
+"""
+import io
+import math
+from typing import Optional, Tuple
+
+MAX_UPLOAD_BYTES = 40 * 1024**2
+MAX_SOURCE_PIXELS = 120_000_000     # anything larger is refused before decoding
+DEFAULT_MAX_SIDE = 2240
+DEFAULT_MAX_PIXELS = 4 * 560 * 560
+
+
+class ImageTooLarge(ValueError):
+    """The upload is too big to decode safely."""
+
+
+def processor_limits(processor) -> Tuple[int, int]:
+    """(max_side, max_pixels) the processor's image pipeline will actually use."""
+    image_processor = getattr(processor, "image_processor", processor)
+    size = getattr(image_processor, "size", None) or {}
+    tiles = getattr(image_processor, "max_image_tiles", None)
+    if tiles and "height" in size and "width" in size:
+        tile = max(size["height"], size["width"])
+        return tile * tiles, tile * tile * tiles
+    if "longest_edge" in size:
+        return size["longest_edge"], size["longest_edge"] ** 2
+    if "height" in size and "width" in size:
+        side = max(size["height"], size["width"])
+        return side, side * side
+    return DEFAULT_MAX_SIDE, DEFAULT_MAX_PIXELS
+
+
+def _fit(width: int, height: int, max_side: int, max_pixels: int) -> Optional[Tuple[int, int]]:
+    """Target size that respects both limits, or None if the image already does."""
+    scale = min(1.0, max_side / max(width, height), math.sqrt(max_pixels / (width * height)))
+    if scale >= 1.0:
+        return None
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_image(data: bytes, max_side: int = DEFAULT_MAX_SIDE, max_pixels: int = DEFAULT_MAX_PIXELS,
+               max_bytes: int = MAX_UPLOAD_BYTES, max_source_pixels: int = MAX_SOURCE_PIXELS):
+    """Decode `data` into an upright RGB image no larger than the given limits."""
+    from PIL import Image, ImageOps
+
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Image file is {len(data) / 1024**2:.0f} MB; the limit is {max_bytes / 1024**2:.0f} MB")
+    try:
+        image = Image.open(io.BytesIO(data))    # reads the header only
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from None
+    width, height = image.size
+    if width * height > max_source_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height / 1e6:.0f} MP); the limit is {max_source_pixels / 1e6:.0f} MP")
+
+    target = _fit(width, height, max_side, max_pixels)
+    if target is not None and image.format == "JPEG":
+        # libjpeg scales by 1/2, 1/4 or 1/8 while decoding, never below `target`
+        image.draft("RGB", target)
+
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    target = _fit(*image.size, max_side, max_pixels)
+    if target is not None:
+        image = image.resize(target, Image.Resampling.BICUBIC, reducing_gap=2.0)
+    return image
@@ -0,0 +1,619 @@
+"""
+Job listings for the Jobs page (and anything else that needs them).
+
+A `JobSource` returns the postings changed since a watermark: the bundled
+sample listings, a SQLite table or a Parquet file. `JobStore` keeps the
+current listings as an immutable `JobSnapshot` (DataFrame plus the search
+and filter indexes built from it) and refreshes incrementally on a
+background thread: only rows with `updated_at` at or past the watermark
+are fetched, those already merged as they are skipped, and the rest merged, and the search, facet and sort indexes are patched for
+just those rows (rows keep their positions, so the rest carry over) before
+the snapshot is swapped in one assignment. Sessions keep reading the
+previous snapshot meanwhile, so a refresh never blocks a rerun or empties
+a cache.
+
+Point the store at real data with FORFORE_JOBS_DB=jobs.sqlite3 or
+FORFORE_JOBS_PARQUET=jobs.parquet.
+"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from forfore.job_filters import JobFacets
+from forfore.job_search import JobSearchIndex
+from forfore.salary import salary_columns, sort_orders, update_sort_orders
+
+# Typed columns every source returns; `visa` holds a list of visa codes
+COLUMNS = {
+    "id": "int64",
+    "title": "string",
+    "company": "string",
+    "location": "string",
+    "salary": "string",
+    "type": "string",
+    "visa": "object",
+    "description": "string",
+    "requirements": "string",
+    "posted": "datetime64[ns]",
+    "category": "string",
+    "updated_at": "datetime64[ns]",
+}
+TEXT_COLUMNS = [name for name, dtype in COLUMNS.items() if dtype == "string"]
+REFRESH_INTERVAL = float(os.environ.get("FORFORE_JOBS_REFRESH_SECONDS", 60))
+REBUILD_FRACTION = 0.25     # a refresh touching more rows than this rebuilds the indexes from scratch
+
+# Sample job data; "posted" is how long ago each listing went up
+SAMPLE_JOBS = [
+    # ---------- SERVICE ----------
+    {
+        "id": 1,
+        "title": "Cafe Barista",
+        "company": "Starbucks Gangnam",
+        "location": "Seoul, Gangnam-gu",
+        "salary": "₩10,000 per hour",
+        "type": "Part-time",
+        "visa": ["F-2", "F-4", "F-5", "F-6"],
+        "description": "Looking for a friendly barista with a passion for coffee. Experience in coffee making is a plus.",
+        "requirements": "Intermediate Korean, available 5 days per week",
+        "posted": timedelta(days=2),
+        "category": "Service"
+    },
+    {
+        "id": 2,
+        "title": "Restaurant Server",
+        "company": "Bonjuk by TheBorn Korea",
+        "location": "Seoul, Jongno-gu",
+        "salary": "₩9,500 per hour",
+        "type": "Part-time",
+        "visa": ["D-2", "D-4", "F-2", "F-4", "F-5", "F-6", "H-2"],
+        "description": "Serve food and assist customers in a Korean restaurant.",
+        "requirements": "Basic Korean communication, friendly attitude",
+        "posted": timedelta(days=1),
+        "category": "Service"
+    },
+    {
+        "id": 3,
+        "title": "Convenience Store Night Shift",
+        "company": "CU Convenience Store",
+        "location": "Seoul, Gwanak-gu",
+        "salary": "₩11,000 per hour (including night bonus)",
+        "type": "Part-time",
+        "visa": ["D-2", "D-4", "F-2", "F-4", "F-5", "F-6", "H-2"],
+        "description": "Night shift position (10 PM – 6 AM). Cashier and stocking duties.",
+        "requirements": "Basic Korean, responsible personality",
+        "posted": timedelta(hours=12),
+        "category": "Service"
+    },
+    {
+        "id": 4,
+        "title": "Hotel Waiter / Waitress",
+        "company": "Shilla Hotel",
+        "location": "Seoul, Jung-gu",
+        "salary": "₩10,500 per hour",
+        "type": "Part-time",
+        "visa": ["F-2", "F-4", "F-5", "F-6", "H-2"],
+        "description": "Serve guests at hotel restaurants and banquets.",
+        "requirements": "Intermediate Korean and English communication skills",
+        "posted": timedelta(days=3),
+        "category": "Service"
+    },
+
+    # ---------- LOGISTICS / DELIVERY ----------
+    {
+        "id": 5,
+        "title": "Warehouse Packaging Staff",
+        "company": "Coupang Logistics Center",
+        "location": "Bucheon, Gyeonggi-do",
+        "salary": "₩12,000 per hour",
+        "type": "Short-term",
+        "visa": ["E-9", "H-2", "F-2", "F-4", "F-5"],
+        "description": "Work includes packing and preparing goods for shipment in a warehouse environment.",
+        "requirements": "Physically fit, basic Korean understanding",
+        "posted": timedelta(days=1),
+        "category": "Logistics/Delivery"
+    },
+    {
+        "id": 6,
+        "title": "Delivery Rider",
+        "company": "Baemin Delivery",
+        "location": "Incheon, Namdong-gu",
+        "salary": "₩15,000 per delivery hour (average)",
+        "type": "Part-time",
+        "visa": ["H-2", "F-4", "F-5", "F-6"],
+        "description": "Deliver food orders around local neighborhoods using a motorbike.",
+        "requirements": "Motorcycle license, smartphone with GPS",
+        "posted": timedelta(days=1),
+        "category": "Logistics/Delivery"
+    },
+    {
+        "id": 7,
+        "title": "Warehouse Loader",
+        "company": "CJ Logistics",
+        "location": "Gimpo, Gyeonggi-do",
+        "salary": "₩11,500 per hour",
+        "type": "Full-time",
+        "visa": ["E-9", "H-2", "F-4", "F-5"],
+        "description": "Loading and unloading parcels and organizing warehouse space.",
+        "requirements": "Physically strong and able to lift packages up to 20kg",
+        "posted": timedelta(days=2),
+        "category": "Logistics/Delivery"
+    },
+
+    # ---------- IT / DEVELOPMENT ----------
+    {
+        "id": 8,
+        "title": "Backend Developer (Python/Django)",
+        "company": "Tech Startup Korea",
+        "location": "Seoul, Gangnam-gu",
+        "salary": "₩40M–₩60M per year",
+        "type": "Full-time",
+        "visa": ["E-7", "F-2", "F-5"],
+        "description": "We are looking for an experienced backend engineer to build scalable systems.",
+        "requirements": "3+ years of Python experience, AWS experience preferred",
+        "posted": timedelta(days=7),
+        "category": "IT/Development"
+    },
+    {
+        "id": 9,
+        "title": "Frontend Developer (React)",
+        "company": "NextGen Web Labs",
+        "location": "Seoul, Mapo-gu",
+        "salary": "₩45M–₩65M per year",
+        "type": "Full-time",
+        "visa": ["E-7", "F-2", "F-5"],
+        "description": "Develop responsive web interfaces using React and TypeScript.",
+        "requirements": "2+ years frontend experience, portfolio preferred",
+        "posted": timedelta(days=5),
+        "category": "IT/Development"
+    },
+    {
+        "id": 10,
+        "title": "Data Analyst Intern",
+        "company": "K-Digital Analytics",
+        "location": "Seoul, Seocho-gu",
+        "salary": "₩2,000,000 per month",
+        "type": "Internship",
+        "visa": ["D-2", "D-10", "F-2", "F-5", "F-6"],
+        "description": "Assist data team with SQL queries, dashboards, and basic data visualization.",
+        "requirements": "Knowledge of Python, Excel, and data analytics tools",
+        "posted": timedelta(days=3),
+        "category": "IT/Development"
+    },
+
+    # ---------- EDUCATION ----------
+    {
+        "id": 11,
+        "title": "English Instructor",
+        "company": "ABC Language Academy",
+        "location": "Seoul, Songpa-gu",
+        "salary": "₩2,500,000 per month",
+        "type": "Full-time",
+        "visa": ["E-2", "F-2", "F-5", "F-6"],
+        "description": "Teach conversational English to elementary school students in small classes.",
+        "requirements": "Native-level English, teaching experience preferred",
+        "posted": timedelta(days=5),
+        "category": "Education"
+    },
+    {
+        "id": 12,
+        "title": "Math Tutor",
+        "company": "Bright Minds Academy",
+        "location": "Seoul, Seongdong-gu",
+        "salary": "₩25,000 per hour",
+        "type": "Part-time",
+        "visa": ["F-2", "F-5", "F-6"],
+        "description": "Private tutoring for middle school math students. Materials provided.",
+        "requirements": "Fluent Korean or English, tutoring experience a plus",
+        "posted": timedelta(days=2),
+        "category": "Education"
+    },
+
+    # ---------- MANUFACTURING ----------
+    {
+        "id": 13,
+        "title": "Factory Line Worker",
+        "company": "Samsung Electronics Partner",
+        "location": "Suwon, Gyeonggi-do",
+        "salary": "₩2,200,000 per month",
+        "type": "Full-time",
+        "visa": ["E-9", "H-2", "F-4", "F-5"],
+        "description": "Assemble electronic devices on production lines. Dormitory provided.",
+        "requirements": "Hardworking, night shift availability preferred",
+        "posted": timedelta(days=4),
+        "category": "Manufacturing"
+    },
+    {
+        "id": 14,
+        "title": "Machine Operator",
+        "company": "Hyundai Precision Parts",
+        "location": "Ulsan, Nam-gu",
+        "salary": "₩2,500,000 per month",
+        "type": "Full-time",
+        "visa": ["E-9", "H-2", "F-4", "F-5"],
+        "description": "Operate metal-cutting and assembly machines in an auto parts plant.",
+        "requirements": "Basic Korean, manufacturing experience preferred",
+        "posted": timedelta(days=3),
+        "category": "Manufacturing"
+    },
+
+    # ---------- MARKETING / PR ----------
+    {
+        "id": 15,
+        "title": "Marketing Intern",
+        "company": "Global Marketing Co.",
+        "location": "Seoul, Yeongdeungpo-gu",
+        "salary": "₩1,800,000 per month",
+        "type": "Internship",
+        "visa": ["D-2", "D-10", "F-2", "F-5", "F-6"],
+        "description": "Assist in social media marketing, content creation, and campaign analysis.",
+        "requirements": "Advanced Korean, interest in digital marketing",
+        "posted": timedelta(days=2),
+        "category": "Marketing/PR"
+    },
+    {
+        "id": 16,
+        "title": "Social Media Manager",
+        "company": "Seoul Trend Agency",
+        "location": "Seoul, Gangnam-gu",
+        "salary": "₩3,000,000 per month",
+        "type": "Full-time",
+        "visa": ["E-7", "F-2", "F-5", "F-6"],
+        "description": "Manage Instagram, TikTok, and YouTube accounts for brand clients.",
+        "requirements": "Experience in influencer marketing, fluent English",
+        "posted": timedelta(days=4),
+        "category": "Marketing/PR"
+    },
+
+    # ---------- TRANSLATION / INTERPRETATION ----------
+    {
+        "id": 17,
+        "title": "Chinese Translator",
+        "company": "Global Translation Agency",
+        "location": "Seoul, Mapo-gu",
+        "salary": "Negotiable per project",
+        "type": "Freelance",
+        "visa": ["F-2", "F-4", "F-5", "F-6"],
+        "description": "Translation between Chinese and Korean. Remote work available.",
+        "requirements": "Native Chinese proficiency, 2+ years translation experience",
+        "posted": timedelta(days=3),
+        "category": "Translation/Interpretation"
+    },
+    {
+        "id": 18,
+        "title": "Japanese Interpreter",
+        "company": "Korea Trade Center",
+        "location": "Busan, Haeundae-gu",
+        "salary": "₩250,000 per day",
+        "type": "Freelance",
+        "visa": ["F-2", "F-4", "F-5", "F-6"],
+        "description": "Interpret for business meetings between Korean and Japanese clients.",
+        "requirements": "Fluent in Japanese and Korean, experience in trade preferred",
+        "posted": timedelta(days=2),
+        "category": "Translation/Interpretation"
+    },
+]
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerce a source frame to COLUMNS and parse its salaries (see
+    forfore.salary), once per fetched row; a `deleted` flag column is kept
+    if present.
+    """
+    df = df.copy()
+    for column in TEXT_COLUMNS:
+        df[column] = df[column].fillna("").astype(str)
+    df["id"] = df["id"].astype("int64")
+    df["visa"] = df["visa"].map(_visa_list)
+    for column in ("posted", "updated_at"):
+        df[column] = _naive_utc(df[column])
+    extra = ["deleted"] if "deleted" in df.columns else []
+    df = df[list(COLUMNS) + extra].reset_index(drop=True)
+    return pd.concat([df, salary_columns(df["salary"])], axis=1)
+
+
+def _naive_utc(values: pd.Series) -> pd.Series:
+    """
+    ISO timestamps in any mix of formats and offsets as naive UTC; naive
+    input is taken to be UTC already, as SQLite's julianday() does.
+    """
+    return pd.to_datetime(values, format="ISO8601", utc=True).dt.tz_localize(None).astype("datetime64[ns]")
+
+
+def _visa_list(value) -> list:
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return list(value) if value is not None else []
+
+
+def _empty_frame() -> pd.DataFrame:
+    df = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in COLUMNS.items()})
+    return pd.concat([df, salary_columns(df["salary"])], axis=1)
+
+
+class JobSource(ABC):
+    """Where listings come from. `fetch(None)` returns everything."""
+
+    @abstractmethod
+    def fetch(self, since: Optional[datetime]) -> pd.DataFrame:
+        """
+        Rows whose `updated_at` is at or after `since`, typed as in COLUMNS.
+        Inclusive, so rows written in the same instant as the watermark are
+        not missed; `JobStore` skips the ones it already has.
+        """
+
+
+class SampleJobSource(JobSource):
+    """The built-in demo listings, dated relative to when they are first fetched."""
+
+    def fetch(self, since: Optional[datetime]) -> pd.DataFrame:
+        if since is not None:
+            return _empty_frame()
+        now = datetime.now()
+        rows = [dict(job, posted=now - job["posted"], updated_at=now - job["posted"]) for job in SAMPLE_JOBS]
+        return _typed(pd.DataFrame(rows))
+
+
+class SQLiteJobSource(JobSource):
+    """
+    A `jobs` table with the COLUMNS schema (visa as comma-separated text,
+    timestamps as ISO strings) and an optional `deleted` flag. Timestamps are
+    compared with julianday(), so mixed ISO formats and UTC offsets order by
+    the instant they name rather than as text.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY, title TEXT, company TEXT, location TEXT, salary TEXT,
+            type TEXT, visa TEXT, description TEXT, requirements TEXT, posted TEXT,
+            category TEXT, updated_at TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at);
+        CREATE INDEX IF NOT EXISTS jobs_updated_julianday ON jobs (julianday(updated_at));
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with sqlite3.connect(path) as db:
+            db.executescript(self.SCHEMA)
+
+    def fetch(self, since: Optional[datetime]) -> pd.DataFrame:
+        query = "SELECT * FROM jobs"
+        params = ()
+        if since is not None:
+            query += " WHERE julianday(updated_at) >= julianday(?)"
+            # julianday() keeps milliseconds only; the store skips rows it gets twice
+            params = ((since - timedelta(milliseconds=1)).isoformat(),)
+        with sqlite3.connect(self.path) as db:
+            df = pd.read_sql_query(query, db, params=params)
+        if df.empty:
+            return _empty_frame()
+        df["deleted"] = df["deleted"].astype(bool)
+        return _typed(df)
+
+    def upsert(self, df: pd.DataFrame) -> None:
+        """Insert or replace listings, e.g. to seed the store from the sample data."""
+        rows = df.assign(
+            visa=df["visa"].map(",".join),
+            posted=df["posted"].map(pd.Timestamp.isoformat),
+            updated_at=df["updated_at"].map(pd.Timestamp.isoformat),
+            deleted=df["deleted"].astype(int) if "deleted" in df.columns else 0,
+        )[list(COLUMNS) + ["deleted"]]
+        with sqlite3.connect(self.path) as db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(rows.columns)}) VALUES ({', '.join('?' * len(rows.columns))})",
+                rows.itertuples(index=False, name=None),
+            )
+
+
+class ParquetJobSource(JobSource):
+    """A Parquet file with the COLUMNS schema; re-read (filtered by watermark) only when it changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+
+    def fetch(self, since: Optional[datetime]) -> pd.DataFrame:
+        mtime = os.stat(self.path).st_mtime_ns
+        if since is not None and mtime == self._mtime:
+            return _empty_frame()
+        df = pd.read_parquet(self.path, filters=self._filters(since))   # needs pyarrow
+        self._mtime = mtime
+        if df.empty:
+            return _empty_frame()
+        df = _typed(df)
+        return df[df["updated_at"] >= pd.Timestamp(since)].reset_index(drop=True) if since is not None else df
+
+    def _filters(self, since: Optional[datetime]) -> Optional[list]:
+        """Watermark pushdown for a timestamp column (UTC if it has a zone); text columns are filtered after parsing."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        column = pq.read_schema(self.path).field("updated_at").type
+        if since is None or not pa.types.is_timestamp(column):
+            return None
+        since = pd.Timestamp(since)
+        return [("updated_at", ">=", since.tz_localize("UTC") if column.tz else since)]
+
+
+def source_from_env() -> JobSource:
+    if os.environ.get("FORFORE_JOBS_DB"):
+        return SQLiteJobSource(os.environ["FORFORE_JOBS_DB"])
+    if os.environ.get("FORFORE_JOBS_PARQUET"):
+        return ParquetJobSource(os.environ["FORFORE_JOBS_PARQUET"])
+    return SampleJobSource()
+
+
+@dataclass(frozen=True)
+class JobSnapshot:
+    """One consistent version of the listings and the indexes built from them."""
+    df: pd.DataFrame
+    search: JobSearchIndex
+    facets: JobFacets
+    orders: "dict[str, np.ndarray]"     # row positions pre-sorted by recency and pay
+    watermark: Optional[datetime]
+    version: int = 0
+    built_at: float = field(default_factory=time.time)
+
+
+def unseen_updates(current: pd.DataFrame, updates: pd.DataFrame, watermark: Optional[datetime]) -> pd.DataFrame:
+    """
+    `updates` without the rows at the watermark that `current` already holds
+    as they are (or that were deleted and are already gone). Sources fetch
+    the watermark inclusively, so these come back on every refresh.
+    """
+    if watermark is None or updates.empty:
+        return updates
+    position = pd.Series(np.arange(len(current)), index=current["id"].to_numpy())
+    columns = list(COLUMNS)
+    seen = np.zeros(len(updates), dtype=bool)
+    for i in np.flatnonzero((updates["updated_at"] <= watermark).to_numpy()):
+        row = updates.iloc[i]
+        if row.get("deleted", False):
+            seen[i] = row["id"] not in position.index
+        elif row["id"] in position.index:
+            seen[i] = row[columns].tolist() == current.iloc[position[row["id"]]][columns].tolist()
+    return updates[~seen].reset_index(drop=True)
+
+
+def merge_updates(current: pd.DataFrame, updates: pd.DataFrame) -> "tuple[pd.DataFrame, np.ndarray, np.ndarray]":
+    """
+    Replace changed listings by id in place, append new ones and drop those
+    flagged `deleted`. Returns (frame, remap, changed): `remap[old row]` is
+    each old row's new position (-1 if deleted) and `changed` the positions
+    of replaced and appended rows, so indexes can be patched instead of rebuilt.
+    """
+    deleted = updates["deleted"].astype(bool).to_numpy() if "deleted" in updates.columns else np.zeros(len(updates), bool)
+    updates = updates.drop(columns=["deleted"], errors="ignore")
+    last = ~updates["id"].duplicated(keep="last").to_numpy()     # one change per id
+    updates, deleted = updates[last].reset_index(drop=True), deleted[last]
+    old_position = pd.Series(np.arange(len(current)), index=current["id"].to_numpy())
+    existing = updates["id"].isin(old_position.index).to_numpy()
+
+    gone = np.zeros(len(current), dtype=bool)
+    gone[old_position[updates["id"][existing & deleted]].to_numpy()] = True
+    remap = np.full(len(current), -1, dtype=np.int64)
+    remap[~gone] = np.arange(int((~gone).sum()))
+
+    replaced = updates[existing & ~deleted]
+    appended = updates[~existing & ~deleted]
+    replaced_rows = remap[old_position[replaced["id"]].to_numpy()]
+    kept = current[~gone]
+    # Row i of the new frame is row take[i] of kept + replaced + appended
+    take = np.arange(len(kept) + len(appended))
+    take[replaced_rows] = len(kept) + np.arange(len(replaced))
+    take[len(kept):] += len(replaced)
+    parts = [part for part in (kept, replaced, appended) if len(part)] or [current.iloc[:0]]
+    df = pd.concat(parts, ignore_index=True).iloc[take].reset_index(drop=True)
+    changed = np.concatenate([replaced_rows, np.arange(len(kept), len(df))])
+    return df, remap, changed
+
+
+class JobStore:
+    """
+    Holds the latest `JobSnapshot`. The first access loads synchronously;
+    after that `refresh_in_background` fetches only what changed.
+    """
+
+    def __init__(self, source: Optional[JobSource] = None, refresh_interval: float = REFRESH_INTERVAL):
+        self.source = source or source_from_env()
+        self.refresh_interval = refresh_interval
+        self.last_error: Optional[BaseException] = None
+        self._snapshot: Optional[JobSnapshot] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()          # one refresh at a time
+        self._refreshing = False
+
+    @property
+    def snapshot(self) -> JobSnapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._refresh_locked()
+        return self._snapshot
+
+    def _build(self, df: pd.DataFrame, watermark: Optional[datetime], version: int) -> JobSnapshot:
+        return JobSnapshot(
+            df=df, search=JobSearchIndex(df), facets=JobFacets(df), orders=sort_orders(df),
+            watermark=watermark, version=version,
+        )
+
+    def _patch(self, current: JobSnapshot, df: pd.DataFrame, remap: np.ndarray, changed: np.ndarray,
+               watermark: Optional[datetime]) -> JobSnapshot:
+        """The next snapshot, with only the changed rows re-indexed."""
+        return JobSnapshot(
+            df=df,
+            search=current.search.updated(df, remap, changed),
+            facets=current.facets.updated(df, remap, changed),
+            orders=update_sort_orders(current.orders, df, remap, changed),
+            watermark=watermark,
+            version=current.version + 1,
+        )
+
+    def _refresh_locked(self) -> bool:
+        """Fetch and merge changes; True if a new snapshot was swapped in."""
+        self._last_refresh = time.monotonic()
+        current = self._snapshot
+        updates = self.source.fetch(current.watermark if current is not None else None)
+        if current is not None:
+            updates = unseen_updates(current.df, updates, current.watermark)
+        if current is not None and updates.empty:
+            return False
+        df, remap, changed = merge_updates(current.df if current is not None else _empty_frame(), updates)
+        candidates = [w for w in (current and current.watermark, updates["updated_at"].max()) if pd.notna(w)]
+        watermark = max(candidates) if candidates else None
+        touched = len(changed) + int((remap < 0).sum())
+        if current is None or touched > REBUILD_FRACTION * max(len(df), 1):
+            self._snapshot = self._build(df, watermark, current.version + 1 if current is not None else 0)
+        else:
+            self._snapshot = self._patch(current, df, remap, changed, watermark)
+        return True
+
+    def refresh(self) -> bool:
+        with self._lock:
+            return self._refresh_locked()
+
+    def refresh_in_background(self) -> None:
+        """Start a refresh if the last one is older than `refresh_interval`; never waits for it."""
+        with self._lock:
+            due = time.monotonic() - self._last_refresh >= self.refresh_interval
+            if not due or self._refreshing or self._snapshot is None:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:   # keep serving the previous snapshot
+                self.last_error = e
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_run, name="jobs-refresh", daemon=True).start()
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """The process-wide job store, shared by every page and session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def load_job_data() -> pd.DataFrame:
+    """Current listings."""
+    return get_job_store().snapshot.df
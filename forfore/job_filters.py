@@ -0,0 +1,167 @@
+"""
+Filter and facet-count structure for the Jobs page sidebar.
+
+Single-valued columns (location, category, employment type) are dictionary
+encoded into small integer codes; list columns (eligible visas) become one
+bitset per value, packed 64 rows to a word. A filter combination is then a
+handful of vectorized comparisons and bitwise AND/ORs, and the per-option
+counts shown in the sidebar come from the same bitsets:
+each facet is counted under every *other* active filter, so the numbers say
+how many listings picking that option would show. After a refresh,
+`updated` re-encodes only the changed listings and carries the rest over.
+"""
+import copy
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ("location", "category", "type")
+MULTI_COLUMNS = ("visa",)
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    """Boolean row mask -> bitset of uint64 words."""
+    bits = np.packbits(mask, bitorder="little")
+    return np.pad(bits, (0, -len(bits) % 8)).view(np.uint64)
+
+
+def _unpack(bits: np.ndarray, size: int) -> np.ndarray:
+    return np.unpackbits(bits.view(np.uint8), count=size, bitorder="little").astype(bool)
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(bits: np.ndarray) -> int:
+        return int(np.bitwise_count(bits).sum())
+else:   # NumPy < 2.0
+    def _popcount(bits: np.ndarray) -> int:
+        return int(np.unpackbits(bits.view(np.uint8)).sum())
+
+
+class JobFacets:
+    """
+    Built once per jobs DataFrame. Selections are a dict mapping a column to
+    the chosen value ("All" or None for no filter) for categorical columns,
+    or to a list of values (match any) for list columns.
+    """
+
+    def __init__(self, df, categorical=CATEGORICAL_COLUMNS, multi=MULTI_COLUMNS):
+        self.size = len(df)
+        self.values: "dict[str, list]" = {}
+        self.codes: "dict[str, np.ndarray]" = {}
+        self._code_of: "dict[str, dict[str, int]]" = {}
+        self.bitsets: "dict[str, dict[str, np.ndarray]]" = {}
+        for column in categorical:
+            # Sorted, so codes follow the order the selectboxes list the values in
+            codes, uniques = pd.factorize(df[column], sort=True)
+            self.codes[column] = codes.astype(np.int32)
+            self.values[column] = uniques.tolist()
+            self._code_of[column] = {value: code for code, value in enumerate(self.values[column])}
+        for column in multi:
+            rows_by_value: "dict[str, list]" = {}
+            for row, items in enumerate(df[column]):
+                for item in items:
+                    rows_by_value.setdefault(item, []).append(row)
+            self.values[column] = sorted(rows_by_value)
+            self.bitsets[column] = {}
+            for value in self.values[column]:
+                mask = np.zeros(self.size, dtype=bool)
+                mask[rows_by_value[value]] = True
+                self.bitsets[column][value] = _pack(mask)
+        self._all = _pack(np.ones(self.size, dtype=bool))
+
+    def updated(self, df, remap: np.ndarray, changed: np.ndarray) -> "JobFacets":
+        """
+        Facets for `df`, the listings after a refresh, with the same `remap` /
+        `changed` convention as JobSearchIndex.updated. Values no listing uses
+        any more disappear; this instance is left untouched.
+        """
+        new = copy.copy(self)
+        new.size = len(df)
+        new.values, new.codes, new._code_of, new.bitsets = dict(self.values), {}, {}, {}
+        changed = np.asarray(changed, dtype=np.int64)
+        kept = remap >= 0
+        for column in self.codes:
+            fresh = df[column].iloc[changed].tolist()
+            values = sorted(set(self.values[column]).union(fresh))
+            code_of = {value: code for code, value in enumerate(values)}
+            old_to_new = np.array([code_of[value] for value in self.values[column]], dtype=np.int32)
+            codes = np.empty(new.size, dtype=np.int32)
+            codes[remap[kept]] = old_to_new[self.codes[column][kept]]
+            codes[changed] = [code_of[value] for value in fresh]
+            used = np.bincount(codes, minlength=len(values)) > 0
+            if not used.all():
+                codes = (np.cumsum(used) - 1).astype(np.int32)[codes]
+                values = [value for value, u in zip(values, used) if u]
+                code_of = {value: code for code, value in enumerate(values)}
+            new.codes[column], new.values[column], new._code_of[column] = codes, values, code_of
+        for column, bitsets in self.bitsets.items():
+            fresh = df[column].iloc[changed].tolist()
+            masks = {}
+            for value, bits in bitsets.items():
+                mask = np.zeros(new.size, dtype=bool)
+                mask[remap[kept]] = _unpack(bits, self.size)[kept]
+                mask[changed] = False
+                masks[value] = mask
+            for row, items in zip(changed.tolist(), fresh):
+                for item in items:
+                    masks.setdefault(item, np.zeros(new.size, dtype=bool))[row] = True
+            new.values[column] = sorted(value for value, mask in masks.items() if mask.any())
+            new.bitsets[column] = {value: _pack(masks[value]) for value in new.values[column]}
+        new._all = _pack(np.ones(new.size, dtype=bool))
+        return new
+
+    def _column_bits(self, column: str, selection) -> Optional[np.ndarray]:
+        """Bitset for one column's selection, or None when it does not filter."""
+        if column in self.codes:
+            if selection in (None, "All"):
+                return None
+            code = self._code_of[column].get(selection)
+            if code is None:
+                return np.zeros_like(self._all)
+            return _pack(self.codes[column] == code)
+        if not selection:
+            return None
+        bits = np.zeros_like(self._all)
+        for value in selection:
+            if value in self.bitsets[column]:
+                bits |= self.bitsets[column][value]
+        return bits
+
+    def bits(self, selections: dict, base: Optional[np.ndarray] = None, skip: Optional[str] = None) -> np.ndarray:
+        """Bitset of rows passing every selection except `skip`, within `base` if given."""
+        bits = self._all.copy() if base is None else base.copy()
+        for column, selection in selections.items():
+            if column == skip:
+                continue
+            column_bits = self._column_bits(column, selection)
+            if column_bits is not None:
+                bits &= column_bits
+        return bits
+
+    def rows_bits(self, rows: np.ndarray) -> np.ndarray:
+        """Bitset for a set of row positions, e.g. search results."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return _pack(mask)
+
+    def mask_bits(self, mask: np.ndarray) -> np.ndarray:
+        """Bitset for a boolean row mask, e.g. a salary range."""
+        return _pack(mask)
+
+    def mask(self, selections: dict, base: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean row mask for `selections`, usable with `df[mask]`."""
+        return _unpack(self.bits(selections, base), self.size)
+
+    def counts(self, column: str, selections: dict, base: Optional[np.ndarray] = None) -> "dict[str, int]":
+        """Rows per value of `column` under all other selections; key "All" holds their total."""
+        bits = self.bits(selections, base, skip=column)
+        if column in self.codes:
+            rows = _unpack(bits, self.size)
+            per_code = np.bincount(self.codes[column][rows], minlength=len(self.values[column]))
+            counts = dict(zip(self.values[column], per_code.tolist()))
+        else:
+            counts = {value: _popcount(bits & value_bits) for value, value_bits in self.bitsets[column].items()}
+        counts["All"] = _popcount(bits)
+        return counts
+
@@ -0,0 +1,188 @@
+"""
+Job recommendations for the chatbot.
+
+For a question such as "what jobs can I do on an E-9 visa near Suwon",
+`JobRetriever` narrows the listings with the Jobs page's own filter
+structures (visa bitsets, location codes), ranks only those candidates by
+embedding similarity, and formats the top few as a short system note. The
+prompt grows by a handful of lines instead of the whole job board.
+
+After a job refresh the next retriever is built on a background thread,
+embedding only listings that are new or whose `updated_at` moved, while
+questions keep being answered from the previous one.
+"""
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from forfore.job_data import JobSnapshot, get_job_store
+from forfore.retrieval import DEFAULT_EMBEDDING_MODEL, INDEX_DIR, SlotIndex, get_embedder
+
+_VISA_RE = re.compile(r"\b([A-Ha-h])\s*-?\s*(\d{1,2})\b")
+_JOB_INTENT_RE = re.compile(
+    r"\b(jobs?|work(ing)?|hiring|employ\w*|part[- ]?time|full[- ]?time|vacanc\w*|position|career|salary|wage)\b"
+    r"|일자리|알바|아르바이트|채용|취업|구인|구직|직장|일하",
+    re.IGNORECASE,
+)
+
+
+def wants_jobs(text: str) -> bool:
+    """Only questions about finding work get listings injected."""
+    return bool(_JOB_INTENT_RE.search(text))
+
+
+def mentioned_visas(text: str, known: list) -> list:
+    """Visa codes in `text` ("E9", "e-9", "E 9") that appear in the listings."""
+    found = {f"{letter.upper()}-{number}" for letter, number in _VISA_RE.findall(text)}
+    return [visa for visa in known if visa in found]
+
+
+def listing_text(row) -> str:
+    """What gets embedded for one listing."""
+    return (
+        f"{row.title} at {row.company}, {row.location}. {row.category}, {row.type}, {row.salary}. "
+        f"Visas: {', '.join(row.visa)}. {row.description} {row.requirements}"
+    )
+
+
+def listing_line(row) -> str:
+    """Compact form for the prompt."""
+    return f"- {row.title} — {row.company} ({row.location}); {row.type}, {row.salary}; visas {', '.join(row.visa)}"
+
+
+def listing_changes(old: pd.DataFrame, new: pd.DataFrame) -> "tuple[np.ndarray, np.ndarray]":
+    """
+    (remap, changed) between two versions of the listings: `remap[old row]`
+    is the row with the same id in `new` (-1 if gone) and `changed` the rows
+    of `new` that are new or whose `updated_at` differs.
+    """
+    remap = pd.Index(new["id"]).get_indexer(old["id"])
+    kept = remap >= 0
+    same = np.zeros(len(new), dtype=bool)
+    old_stamps = old["updated_at"].to_numpy().view("int64")
+    new_stamps = new["updated_at"].to_numpy().view("int64")
+    same[remap[kept]] = old_stamps[kept] == new_stamps[remap[kept]]
+    return remap, np.flatnonzero(~same)
+
+
+class JobRetriever:
+    """Embedding index over one job snapshot, plus visa/location prefilters."""
+
+    def __init__(self, snapshot: JobSnapshot, embedder, index: SlotIndex):
+        self.snapshot = snapshot
+        self.embedder = embedder
+        self.index = index
+        # Location words ("suwon", "gangnam-gu") -> location codes, for matching place names in a question
+        self._place_codes: "dict[str, list]" = {}
+        for code, location in enumerate(snapshot.facets.values["location"]):
+            for part in location.lower().replace(",", " ").split():
+                self._place_codes.setdefault(part, []).append(code)
+                if "-" in part:
+                    self._place_codes.setdefault(part.split("-")[0], []).append(code)
+
+    @classmethod
+    def build(cls, snapshot: JobSnapshot, embedder, index_dir: str = INDEX_DIR, ann: bool = False) -> "JobRetriever":
+        """Index every listing, reusing vectors already stored under `index_dir`."""
+        texts = [listing_text(row) for row in snapshot.df.itertuples(index=False)]
+        return cls(snapshot, embedder, SlotIndex.build(os.path.join(index_dir, "jobs"), texts, embedder, ann=ann))
+
+    def updated(self, snapshot: JobSnapshot, ann: bool = False) -> "JobRetriever":
+        """Retriever for a newer snapshot; only the changed listings are embedded."""
+        remap, changed = listing_changes(self.snapshot.df, snapshot.df)
+        texts = [listing_text(row) for row in snapshot.df.iloc[changed].itertuples(index=False)]
+        return JobRetriever(snapshot, self.embedder, self.index.updated(remap, changed, texts, ann=ann))
+
+    def _candidates(self, question: str) -> Optional[np.ndarray]:
+        """Rows eligible for the visas and places named in `question`; None means all rows."""
+        facets = self.snapshot.facets
+        visas = mentioned_visas(question, facets.values["visa"])
+        words = set(re.findall(r"[\w-]+", question.lower()))
+        codes = sorted({code for word in words for code in self._place_codes.get(word, ())})
+        if not visas and not codes:
+            return None
+        mask = facets.mask({"visa": visas})
+        if codes:
+            in_place = mask & np.isin(facets.codes["location"], codes)
+            # Nothing in that exact place: fall back to the visa filter alone
+            mask = in_place if in_place.any() else mask
+        return np.flatnonzero(mask)
+
+    def retrieve(self, question: str, k: int = 5) -> list:
+        """Row positions of the `k` listings most relevant to `question`."""
+        candidates = self._candidates(question)
+        if candidates is not None and not len(candidates):
+            return []
+        query = self.embedder.embed([question], kind="query")[0]
+        rows, _ = self.index.search(query, k, candidates)
+        return rows.tolist()
+
+    def context(self, question: str, k: int = 5) -> Optional[str]:
+        """System note with the top-k listings for a job question, or None."""
+        if not wants_jobs(question):
+            return None
+        rows = self.retrieve(question, k)
+        if not rows:
+            return None
+        lines = [listing_line(row) for row in self.snapshot.df.iloc[rows].itertuples(index=False)]
+        return (
+            "Current job listings from the ForFore Jobs page that may fit the user's question "
+            "(recommend only from these, and tell the user to check visa eligibility):\n" + "\n".join(lines)
+        )
+
+
+_retriever: Optional[JobRetriever] = None
+_retriever_lock = threading.Lock()
+_builder: Optional[threading.Thread] = None
+last_error: Optional[Exception] = None
+
+
+def _catch_up(embedder) -> None:
+    """Build retrievers until one matches the store's current snapshot."""
+    global _retriever, last_error
+    ann = os.environ.get("FORFORE_ANN") == "1"
+    try:
+        while True:
+            snapshot = get_job_store().snapshot
+            current = _retriever
+            if current is not None and current.snapshot is snapshot and current.embedder is embedder:
+                break
+            if current is None or current.embedder is not embedder:
+                current = JobRetriever.build(snapshot, embedder, ann=ann)
+            else:
+                current = current.updated(snapshot, ann=ann)
+            with _retriever_lock:
+                _retriever = current
+        last_error = None
+    except Exception as e:   # keep serving the previous retriever
+        last_error = e
+
+
+def get_job_retriever(embedder_name: Optional[str] = None, wait: bool = False) -> Optional[JobRetriever]:
+    """
+    Retriever for the newest job snapshot indexed so far. When the store has
+    moved on, a background thread catches up while this keeps returning the
+    previous retriever. Before the first one exists this returns None, or
+    with `wait` blocks until it is built.
+    """
+    global _builder
+    snapshot = get_job_store().snapshot
+    embedder = get_embedder(embedder_name or DEFAULT_EMBEDDING_MODEL)
+    with _retriever_lock:
+        current = _retriever
+        stale = current is None or current.snapshot is not snapshot or current.embedder is not embedder
+        if stale and (_builder is None or not _builder.is_alive()):
+            _builder = threading.Thread(target=_catch_up, args=(embedder,), name="jobs-retriever", daemon=True)
+            _builder.start()
+        builder = _builder
+    if current is not None and current.embedder is embedder:
+        return current
+    if not wait:
+        return None
+    builder.join()
+    if _retriever is None or _retriever.embedder is not embedder:
+        raise RuntimeError(f"Job index could not be built: {last_error}")
+    return _retriever
@@ -0,0 +1,208 @@
+"""
+Full-text search for the Jobs page.
+
+`JobSearchIndex` tokenizes title, company and description once when the
+listings load and keeps an inverted index: a sorted vocabulary plus, per
+term, the rows containing it and their weighted term frequency, stored as
+flat arrays with one offset per term. A query only touches the postings of
+its own terms (found by binary search, so every term also matches as a
+prefix) and applies BM25 to them, which keeps lookups independent of the
+number of listings. Because the BM25 statistics are applied at query time,
+`updated` can patch the postings of a few changed listings after a refresh
+instead of re-tokenizing the whole board.
+
+Korean has no spaces between a word and its particles ("서울에서"), so
+Hangul runs are indexed both whole and as character bigrams; a Korean
+query longer than two syllables is matched through its bigrams.
+"""
+import bisect
+import copy
+import re
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+# Hangul syllables first so that mixed tokens split at the script boundary
+_TOKEN_RE = re.compile(r"[가-힣]+|[^\W_가-힣]+")
+_HANGUL_RE = re.compile(r"[가-힣]+")
+
+# Field weights: a match in the title counts three times as much as in the description
+DEFAULT_FIELDS = {"title": 3.0, "company": 2.0, "description": 1.0}
+
+
+def _bigrams(run: str) -> list:
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str) -> list:
+    """Index terms of `text`: lowercased words, plus bigrams of Hangul runs."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if len(token) > 2 and _HANGUL_RE.fullmatch(token):
+            tokens.extend(_bigrams(token))
+    return tokens
+
+
+def query_terms(query: str) -> list:
+    """Terms a row must match (each as a prefix) for `query`."""
+    terms = []
+    for token in _TOKEN_RE.findall(query.lower()):
+        if len(token) > 2 and _HANGUL_RE.fullmatch(token):
+            terms.extend(_bigrams(token))
+        else:
+            terms.append(token)
+    return list(dict.fromkeys(terms))
+
+
+class JobSearchIndex:
+    """
+    BM25-ranked inverted index over a jobs DataFrame. `search` returns row
+    positions (for `df.iloc`) that match every query term, best first.
+    """
+
+    def __init__(self, df, fields: Optional[dict] = None, k1: float = 1.2, b: float = 0.75,
+                 max_expansions: int = 64):
+        self.fields = fields or DEFAULT_FIELDS
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.size = len(df)
+        self.lengths, postings = self._tokenize(df, np.arange(self.size))
+        self.terms = sorted(postings)
+        # Postings of term i are _rows[_offsets[i]:_offsets[i + 1]] (and the same slice of _tf)
+        self._offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self._offsets[1:] = np.cumsum([len(postings[term]) for term in self.terms])
+        self._rows = np.empty(self._offsets[-1], dtype=np.int32)
+        self._tf = np.empty(self._offsets[-1], dtype=np.float32)
+        for i, term in enumerate(self.terms):
+            start, end = self._offsets[i], self._offsets[i + 1]
+            self._rows[start:end] = np.fromiter(postings[term].keys(), dtype=np.int32, count=end - start)
+            self._tf[start:end] = np.fromiter(postings[term].values(), dtype=np.float32, count=end - start)
+        self._total_length = float(self.lengths.sum())
+
+    def _tokenize(self, df, rows: np.ndarray) -> "tuple[np.ndarray, dict]":
+        """(weighted lengths of `rows`, {term: {row: weighted tf}}) for the given row positions."""
+        postings: "dict[str, dict[int, float]]" = defaultdict(dict)
+        lengths = np.zeros(len(rows))
+        for column, weight in self.fields.items():
+            texts = df[column] if len(rows) == len(df) else df[column].iloc[rows]
+            for i, (row, text) in enumerate(zip(rows.tolist(), texts.fillna("").astype(str))):
+                tokens = tokenize(text)
+                lengths[i] += weight * len(tokens)
+                for token in tokens:
+                    counts = postings[token]
+                    counts[row] = counts.get(row, 0.0) + weight
+        return lengths, postings
+
+    def updated(self, df, remap: np.ndarray, changed: np.ndarray) -> "JobSearchIndex":
+        """
+        Index for `df`, the listings after a refresh, re-tokenizing only the
+        `changed` rows (new positions of replaced and appended listings).
+        `remap[old row]` is each old row's new position, -1 if it was deleted.
+        This index is left untouched for the sessions still reading it.
+        """
+        new = copy.copy(self)
+        new.size = len(df)
+        changed = np.asarray(changed, dtype=np.int64)
+        fresh = np.zeros(new.size, dtype=bool)
+        fresh[changed] = True
+
+        # Drop the postings of deleted and replaced rows, moving the rest to their new positions
+        identity = len(remap) == new.size and bool((remap == np.arange(new.size)).all())
+        moved = self._rows if identity else remap.astype(np.int32)[self._rows]
+        keep = ~fresh[moved] if identity else moved >= 0
+        if not identity:
+            keep[keep] = ~fresh[moved[keep]]
+        offsets = np.concatenate([[0], np.cumsum(keep)])[self._offsets]
+        rows, tf = moved[keep], self._tf[keep]
+
+        new.lengths = np.zeros(new.size)
+        kept = remap >= 0
+        new.lengths[remap[kept]] = self.lengths[kept]
+        new.lengths[changed], postings = self._tokenize(df, changed)
+        new._total_length = float(new.lengths.sum())
+
+        # Vocabulary: both lists are sorted, so this is a linear merge
+        unseen = sorted(term for term in postings if not self._has_term(term))
+        new.terms = sorted(self.terms + unseen) if unseen else self.terms
+        old_ids = np.arange(len(self.terms))
+        if unseen:
+            inserted_before = np.array([bisect.bisect_left(self.terms, term) for term in unseen])
+            old_ids = old_ids + np.searchsorted(inserted_before, old_ids, side="right")
+        counts = np.zeros(len(new.terms), dtype=np.int64)
+        counts[old_ids] = np.diff(offsets)
+
+        # New postings go at the end of their term's run; runs need not be sorted by row
+        positions, add_rows, add_tf = [], [], []
+        for term in sorted(postings):
+            term_id = bisect.bisect_left(new.terms, term)
+            if self._has_term(term):
+                at = offsets[bisect.bisect_left(self.terms, term) + 1]
+            else:
+                at = offsets[bisect.bisect_left(self.terms, term)]
+            positions.append(np.full(len(postings[term]), at))
+            add_rows.append(np.fromiter(postings[term].keys(), dtype=np.int32, count=len(postings[term])))
+            add_tf.append(np.fromiter(postings[term].values(), dtype=np.float32, count=len(postings[term])))
+            counts[term_id] += len(postings[term])
+        if positions:
+            positions = np.concatenate(positions)
+            rows = np.insert(rows, positions, np.concatenate(add_rows))
+            tf = np.insert(tf, positions, np.concatenate(add_tf))
+
+        used = counts > 0
+        if not used.all():     # terms whose only listings were deleted or rewritten
+            new.terms = [term for term, n in zip(new.terms, counts.tolist()) if n]
+            counts = counts[used]
+        new._offsets = np.concatenate([[0], np.cumsum(counts)])
+        new._rows, new._tf = rows, tf
+        return new
+
+    def _has_term(self, term: str) -> bool:
+        i = bisect.bisect_left(self.terms, term)
+        return i < len(self.terms) and self.terms[i] == term
+
+    def _expand(self, prefix: str) -> range:
+        """Vocabulary positions of the terms starting with `prefix`."""
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\U0010ffff", lo=start)
+        return range(start, end)
+
+    def _term_scores(self, prefix: str):
+        """(rows, scores) for one query term, summed over its prefix expansions."""
+        expansions = self._expand(prefix)
+        if not expansions:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        doc_freq = np.diff(self._offsets[expansions.start:expansions.stop + 1])
+        if len(expansions) > self.max_expansions:
+            # Short prefixes ("a") match much of the vocabulary; keep the most common terms
+            top = np.sort(np.argpartition(-doc_freq, self.max_expansions)[:self.max_expansions])
+            starts = self._offsets[expansions.start + top]
+            doc_freq = doc_freq[top]
+            entries = np.concatenate([np.arange(s, s + n) for s, n in zip(starts, doc_freq)])
+            rows, tf = self._rows[entries], self._tf[entries]
+        else:
+            start, end = self._offsets[expansions.start], self._offsets[expansions.stop]
+            rows, tf = self._rows[start:end], self._tf[start:end]
+        idf = np.log(1 + (self.size - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = self._total_length / self.size if self.size and self._total_length > 0 else 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / avg_length)
+        impacts = np.repeat(idf, doc_freq) * tf * (self.k1 + 1) / (tf + norm)
+        unique, inverse = np.unique(rows, return_inverse=True)
+        return unique, np.bincount(inverse, weights=impacts)
+
+    def search(self, query: str) -> Optional[np.ndarray]:
+        """Row positions matching all terms of `query`, best first; None if it has no terms."""
+        terms = query_terms(query)
+        if not terms:
+            return None
+        rows, scores = self._term_scores(terms[0])
+        for term in terms[1:]:
+            if not len(rows):
+                break
+            term_rows, term_scores = self._term_scores(term)
+            rows, left, right = np.intersect1d(rows, term_rows, assume_unique=True, return_indices=True)
+            scores = scores[left] + term_scores[right]
+        # Stable sort keeps the original listing order among equal scores
+        return rows[np.argsort(-scores, kind="stable")].astype(np.int64)
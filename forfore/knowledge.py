@@ -0,0 +1,198 @@
+"""
+Local knowledge base of visa and administrative documents.
+
+Markdown and text files under FORFORE_KB_DIR (default `knowledge/`) are
+split into short passages along headings and paragraphs, embedded with the
+same embedder as the job index, and stored in a memory-mapped index under
+FORFORE_INDEX_DIR. A manifest of file sizes and mtimes means a rebuild only
+re-reads changed files, and the index only embeds passages it has not seen.
+The chatbot adds the few passages closest to a question as a system note,
+so answers are grounded without sending whole documents to the model.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from forfore.retrieval import DEFAULT_EMBEDDING_MODEL, INDEX_DIR, get_embedder, update_index
+
+KB_DIR = os.environ.get("FORFORE_KB_DIR", "knowledge")
+KB_SUFFIXES = (".md", ".markdown", ".txt")
+# Cosine score below which a retrieved passage is dropped. Chosen with the hashing
+# embedder: on six sample notes, eight visa questions scored 0.20-0.53 against their
+# note and four off-topic ones (weather, jokes, dramas, restaurants) at most 0.28, so
+# 0.3 keeps off-topic questions note-free at the cost of some weakly worded matches.
+# E5 models score even unrelated text around 0.7-1.0, so with them 0.3 drops almost
+# nothing; raise it using the scores logged for dropped passages (DEBUG level).
+MIN_SCORE = float(os.environ.get("FORFORE_KB_MIN_SCORE", 0.3))
+CHECK_INTERVAL = 30.0      # seconds between scans of the folder for changes
+
+logger = logging.getLogger(__name__)
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+_SENTENCE_RE = re.compile(r"(?<=[.?!。？！다])\s+")
+
+
+def chunk_text(text: str, max_chars: int = 600) -> list:
+    """
+    (heading, passage) pairs of at most `max_chars`: paragraphs are packed
+    together under their nearest heading, over-long ones split at sentences.
+    """
+    chunks = []
+    heading = ""
+    buffer = []
+
+    def flush():
+        if buffer:
+            chunks.append((heading, " ".join(buffer)))
+            buffer.clear()
+
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        first_line = block.splitlines()[0]
+        match = _HEADING_RE.match(first_line)
+        if match:
+            flush()
+            heading = match.group(1).strip()
+            block = block[len(first_line):].strip()
+            if not block:
+                continue
+        pieces = [block] if len(block) <= max_chars else _SENTENCE_RE.split(block)
+        for piece in pieces:
+            piece = " ".join(piece.split())
+            while len(piece) > max_chars:       # a single sentence longer than a chunk
+                flush()
+                chunks.append((heading, piece[:max_chars]))
+                piece = piece[max_chars:]
+            if sum(len(p) + 1 for p in buffer) + len(piece) > max_chars:
+                flush()
+            if piece:
+                buffer.append(piece)
+    flush()
+    return chunks
+
+
+class KnowledgeBase:
+    """Passages from every file under `kb_dir`, with their embedding index."""
+
+    def __init__(self, kb_dir: str = KB_DIR, index_dir: str = INDEX_DIR, embedder=None,
+                 max_chars: int = 600):
+        self.kb_dir = Path(kb_dir)
+        self.path = os.path.join(index_dir, "kb")
+        self.embedder = embedder or get_embedder(DEFAULT_EMBEDDING_MODEL)
+        self.max_chars = max_chars
+        # ({"source", "heading", "text"} per index row, index), swapped as one so readers never mix versions
+        self._current: tuple = ([], None)
+        self._files: "dict[str, dict]" = {}
+        self._checked = -CHECK_INTERVAL
+        self._lock = threading.Lock()
+        self._load_manifest()
+
+    def _load_manifest(self) -> None:
+        try:
+            with open(f"{self.path}.manifest.json") as f:
+                self._files = json.load(f)
+        except (OSError, ValueError):
+            self._files = {}
+
+    def _scan(self) -> "dict[str, tuple]":
+        if not self.kb_dir.is_dir():
+            return {}
+        return {
+            str(p.relative_to(self.kb_dir)): (p.stat().st_size, p.stat().st_mtime_ns)
+            for p in sorted(self.kb_dir.rglob("*")) if p.is_file() and p.suffix.lower() in KB_SUFFIXES
+        }
+
+    def refresh(self) -> bool:
+        """Re-chunk changed files and update the index; True if anything changed."""
+        with self._lock:
+            self._checked = time.monotonic()
+            scanned = self._scan()
+            changed = False
+            files = {}
+            for name, (size, mtime) in scanned.items():
+                entry = self._files.get(name)
+                if entry is None or entry["size"] != size or entry["mtime"] != mtime:
+                    text = (self.kb_dir / name).read_text(encoding="utf-8", errors="replace")
+                    entry = {"size": size, "mtime": mtime, "chunks": chunk_text(text, self.max_chars)}
+                    changed = True
+                files[name] = entry
+            changed = changed or files.keys() != self._files.keys()
+            if not changed and self._current[1] is not None:
+                return False
+
+            passages = [
+                {"source": name, "heading": heading, "text": text}
+                for name, entry in files.items() for heading, text in entry["chunks"]
+            ]
+            texts = [f"{p['heading']}: {p['text']}" if p["heading"] else p["text"] for p in passages]
+            self._current = (passages, update_index(self.path, texts, self.embedder) if texts else None)
+            self._files = files
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.manifest.json.tmp", "w") as f:
+                json.dump(files, f, ensure_ascii=False)
+            os.replace(f"{self.path}.manifest.json.tmp", f"{self.path}.manifest.json")
+            return True
+
+    @property
+    def passages(self) -> list:
+        return self._current[0]
+
+    def maybe_refresh(self) -> None:
+        """Pick up edited files, checking the folder at most every CHECK_INTERVAL seconds."""
+        if time.monotonic() - self._checked >= CHECK_INTERVAL:
+            self.refresh()
+
+    def retrieve(self, question: str, k: int = 3, min_score: float = MIN_SCORE) -> list:
+        """Up to `k` passages (with "score") closest to `question`."""
+        self.maybe_refresh()
+        passages, index = self._current
+        if index is None:
+            return []
+        query = self.embedder.embed([question], kind="query")[0]
+        rows, scores = index.search(query, k)
+        kept = []
+        for row, score in zip(rows, scores):
+            passage = dict(passages[row], score=float(score))
+            if passage["score"] >= min_score:
+                kept.append(passage)
+            else:
+                logger.debug("Dropped %s (%s) for %r: score %.3f < %.3f", passage["source"],
+                             passage["heading"] or "no heading", question, passage["score"], min_score)
+        return kept
+
+    def context(self, question: str, k: int = 3) -> Optional[str]:
+        """System note with the retrieved passages, or None if nothing relevant was found."""
+        passages = self.retrieve(question, k)
+        if not passages:
+            return None
+        lines = [
+            f"[{p['source']}{' — ' + p['heading'] if p['heading'] else ''}] {p['text']}" for p in passages
+        ]
+        return (
+            "Reference passages from ForFore's visa and administrative documents. Base the answer on "
+            "them where they apply and mention the source:\n" + "\n".join(lines)
+        )
+
+
+_kb: Optional[KnowledgeBase] = None
+_kb_lock = threading.Lock()
+
+
+def has_knowledge_base(kb_dir: str = KB_DIR) -> bool:
+    return Path(kb_dir).is_dir()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """The process-wide knowledge base over KB_DIR."""
+    global _kb
+    with _kb_lock:
+        if _kb is None:
+            _kb = KnowledgeBase()
+        return _kb
@@ -0,0 +1,120 @@
+"""Per-session past-key-values store so each chat turn only prefills new tokens."""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+
+@dataclass
+class _Entry:
+    token_ids: list          # prompt + generated ids the cache was built from
+    cache: Any               # transformers.DynamicCache
+    nbytes: int
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _cache_nbytes(cache) -> int:
+    if hasattr(cache, "layers"):
+        tensors = [t for layer in cache.layers for t in (layer.keys, layer.values)]
+    else:
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors if hasattr(t, "numel"))
+
+
+@lru_cache(maxsize=None)
+def _cache_class():
+    from transformers import DynamicCache
+
+    class _Cache(DynamicCache):
+        """
+        DynamicCache whose `crop` skips layers that were never written. Mllama's
+        cross-attention layers stay empty on text-only turns, and cropping them
+        (assisted decoding does after every step) fails on transformers 5.
+        """
+
+        def crop(self, max_length: int) -> None:
+            layers = getattr(self, "layers", None)
+            if layers is None:      # transformers < 4.56 keeps per-layer tensor lists and handles this itself
+                return super().crop(max_length)
+            for layer in layers:
+                if getattr(layer, "keys", None) is not None:
+                    layer.crop(max_length)
+
+    return _Cache
+
+
+def new_cache():
+    """An empty KV cache for `generate(past_key_values=...)`."""
+    return _cache_class()()
+
+
+def _common_prefix(a: list, b: list) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class SessionKVCache:
+    """
+    Keeps the KV cache of the last turn for every chat session of one model.
+    Total size is capped at `max_bytes`; sessions idle for longer than
+    `idle_ttl` seconds are dropped first, then least recently used ones.
+    """
+
+    def __init__(self, max_bytes: int = 2 * 1024**3, idle_ttl: float = 30 * 60):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def checkout(self, session_id: str, input_ids):
+        """
+        Take the session's cache out of the store, cropped to the prefix it
+        shares with `input_ids`. Returns an empty cache if nothing is reusable.
+        The caller owns the cache until it is handed back with `checkin`.
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return new_cache()
+
+        new_ids = input_ids[0].tolist()
+        # At least one new token has to go through the model to produce logits
+        keep = min(_common_prefix(entry.token_ids, new_ids), entry.cache.get_seq_length(), len(new_ids) - 1)
+        if keep <= 0:
+            return new_cache()
+        entry.cache.crop(keep)
+        return entry.cache
+
+    def checkin(self, session_id: str, output_ids, cache) -> None:
+        """Store the cache produced by `generate` together with the ids it covers."""
+        entry = _Entry(token_ids=output_ids[0].tolist(), cache=cache, nbytes=_cache_nbytes(cache))
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self._evict()
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for sid in [s for s, e in self._entries.items() if now - e.last_used > self.idle_ttl]:
+            del self._entries[sid]
+        total = sum(e.nbytes for e in self._entries.values())
+        while self._entries and total > self.max_bytes:
+            _, oldest = self._entries.popitem(last=False)
+            total -= oldest.nbytes
@@ -0,0 +1,166 @@
+"""
+Per-stage latency histograms for the chatbot pipeline.
+
+Stages are timed with `timed(stage, model)` and aggregated per (stage, model).
+The numbers can be read three ways: `STAGE_METRICS.percentiles()` for the
+sidebar debug panel, `write_textfile()` for a node_exporter textfile
+collector, or `start_http_server()` for Prometheus to scrape /metrics.
+"""
+import bisect
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; wide enough for both image decoding (ms) and CPU generation (minutes)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Series:
+    def __init__(self, reservoir: int):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=reservoir)   # for exact percentiles over recent requests
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            self.bucket_counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        values = sorted(self.recent)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class StageMetrics:
+    """Thread-safe histograms keyed by (stage, model)."""
+
+    def __init__(self, reservoir: int = 1024):
+        self.reservoir = reservoir
+        self._series: "dict[tuple, _Series]" = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, model: str, seconds: float) -> None:
+        with self._lock:
+            series = self._series.get((stage, model))
+            if series is None:
+                series = self._series[(stage, model)] = _Series(self.reservoir)
+            series.observe(seconds)
+
+    def percentiles(self, model: str = None) -> list:
+        """Rows of {stage, model, count, p50_ms, p95_ms, p99_ms, mean_ms}, slowest p95 first."""
+        with self._lock:
+            rows = [
+                {
+                    "stage": stage,
+                    "model": m,
+                    "count": s.count,
+                    **{f"p{int(q * 100)}_ms": s.quantile(q) * 1000 for q in QUANTILES},
+                    "mean_ms": s.total / s.count * 1000,
+                }
+                for (stage, m), s in self._series.items()
+                if model is None or m == model
+            ]
+        return sorted(rows, key=lambda r: r["p95_ms"], reverse=True)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP forfore_stage_seconds Latency of chatbot pipeline stages.",
+            "# TYPE forfore_stage_seconds histogram",
+        ]
+        quantile_lines = [
+            "# HELP forfore_stage_recent_seconds Latency quantiles over the most recent requests.",
+            "# TYPE forfore_stage_recent_seconds summary",
+        ]
+        with self._lock:
+            for (stage, model), s in sorted(self._series.items()):
+                labels = f'stage="{_label(stage)}",model="{_label(model)}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS, s.bucket_counts):
+                    cumulative += n
+                    lines.append(f'forfore_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'forfore_stage_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+                lines.append(f"forfore_stage_seconds_sum{{{labels}}} {s.total}")
+                lines.append(f"forfore_stage_seconds_count{{{labels}}} {s.count}")
+                for q in QUANTILES:
+                    quantile_lines.append(f'forfore_stage_recent_seconds{{{labels},quantile="{q}"}} {s.quantile(q)}')
+        return "\n".join(lines + quantile_lines) + "\n"
+
+
+STAGE_METRICS = StageMetrics()
+
+
+def model_label(model) -> str:
+    """Model id for metric labels; Hugging Face models remember the id they were loaded from."""
+    return getattr(model, "name_or_path", "") or type(model).__name__
+
+
+@contextmanager
+def timed(stage: str, model: str, metrics: StageMetrics = STAGE_METRICS):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(stage, model, time.perf_counter() - start)
+
+
+def write_textfile(path: str, metrics: StageMetrics = STAGE_METRICS) -> None:
+    """Atomically write the Prometheus text format to `path`; safe to call from several threads at once."""
+    # A unique temp file per call in the same directory, so concurrent writers never share one
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(metrics.render_prometheus())
+        os.chmod(tmp, 0o644)    # mkstemp creates 0600; the collector may run as another user
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", metrics: StageMetrics = STAGE_METRICS) -> None:
+    """
+    Serve GET /metrics on a daemon thread. Safe to call on every rerun; starts
+    only once. Listens on localhost unless `host` says otherwise.
+    """
+    global _server
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _server_lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
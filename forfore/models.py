@@ -0,0 +1,179 @@
+"""
+Model loading shared by the chatbot page and the inference worker.
+
+torch and transformers are imported on first use so that pages which never
+touch a model do not pay for them.
+"""
+import os
+from typing import Callable, Optional
+
+from forfore.metrics import timed
+
+# How weights are held when there is no GPU:
+#   float32  - reference precision, ~4 bytes per parameter
+#   bfloat16 - half the memory; falls back to float32 if the CPU has no native bf16
+#   int8     - linear layers dynamically quantized to int8, everything else float32
+CPU_MODES = ("bfloat16", "int8", "float32")
+# torch's intra-op thread pool is process-global, so its size is a process setting; 0 keeps the default
+NUM_THREADS = int(os.environ.get("FORFORE_NUM_THREADS", "0"))
+
+
+def cpu_supports_bf16() -> bool:
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def _quantize_linear_int8(model) -> None:
+    """
+    Swap every nn.Linear (except the LM head) for a dynamically quantized one,
+    one layer at a time so peak memory stays near the bf16 checkpoint size.
+    """
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantLinear
+    from torch.ao.quantization import default_dynamic_qconfig
+
+    for parent_name, parent in list(model.named_modules()):
+        for name, child in list(parent.named_children()):
+            if type(child) is not torch.nn.Linear or "lm_head" in f"{parent_name}.{name}":
+                continue
+            child = child.float()
+            child.qconfig = default_dynamic_qconfig
+            setattr(parent, name, DynamicQuantLinear.from_float(child))
+
+
+def estimate_model_bytes(model_id: str, cpu_mode: str = "bfloat16") -> Optional[int]:
+    """
+    Rough memory need of `model_id` from its safetensors header, before
+    downloading any weights. None when the hub metadata is unavailable.
+    """
+    import torch
+
+    try:
+        from huggingface_hub import get_safetensors_metadata
+
+        params = sum(get_safetensors_metadata(model_id).parameter_count.values())
+    except Exception:
+        return None
+    if torch.cuda.is_available():
+        bytes_per_param = 2
+    elif cpu_mode == "int8":
+        bytes_per_param = 1.5   # int8 linears plus float32 embeddings and norms
+    elif cpu_mode == "bfloat16" and cpu_supports_bf16():
+        bytes_per_param = 2
+    else:
+        bytes_per_param = 4
+    return int(params * bytes_per_param)
+
+
+def model_footprint(model) -> int:
+    """Bytes held by the model's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def warmup(processor, model) -> None:
+    """Run a tiny generation so kernels and allocator pools are ready before the first user."""
+    import torch
+
+    # Plain-string content works for both vision processors and text-only tokenizers
+    messages = [{"role": "user", "content": "Hello"}]
+    prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
+    inputs = processor(text=prompt, return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        model.generate(**inputs, max_new_tokens=2)
+
+
+def _no_progress(phase: str) -> None:
+    pass
+
+
+def model_config(model_id: str):
+    """The checkpoint's config; raises (OSError, ValueError) if `model_id` is not a loadable model."""
+    from transformers import AutoConfig
+
+    return AutoConfig.from_pretrained(model_id, trust_remote_code=True)
+
+
+def _auto_model_class(model_id: str):
+    """
+    ImageTextToText for multimodal checkpoints, CausalLM for text-only ones such
+    as draft models. (AutoModelForVision2Seq is gone in transformers 5.)
+    """
+    from transformers import AutoModelForCausalLM, AutoModelForImageTextToText
+
+    config = model_config(model_id)
+    return AutoModelForImageTextToText if hasattr(config, "vision_config") else AutoModelForCausalLM
+
+
+def _dtype_kwargs(dtype) -> dict:
+    """from_pretrained's weight dtype argument: `dtype` since transformers 4.56, `torch_dtype` before."""
+    import transformers
+    from packaging.version import Version
+
+    return {"dtype": dtype} if Version(transformers.__version__) >= Version("4.56") else {"torch_dtype": dtype}
+
+
+def load_processor_and_model(model_id: str, cpu_mode: str = "bfloat16", num_threads: Optional[int] = None,
+                             do_warmup: bool = True, progress: Callable[[str], None] = _no_progress):
+    """
+    Load processor and model for `model_id` on the best available device.
+    Text-only checkpoints (e.g. a draft model for speculative decoding) load
+    as causal LMs; their "processor" is the tokenizer.
+    On CPU, `cpu_mode` picks the weight format (see CPU_MODES) and
+    `num_threads` > 0 pins the intra-op thread pool size for the whole
+    process (FORFORE_NUM_THREADS unless given). `progress` is
+    called with a short description as each loading phase starts.
+    """
+    progress("Importing PyTorch")
+    import torch
+    from transformers import AutoProcessor
+
+    progress("Loading processor")
+    with timed("load_processor", model_id):
+        processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
+    progress("Downloading and loading weights")
+    model_class = _auto_model_class(model_id)
+
+    if torch.cuda.is_available():
+        with timed("load_weights", model_id):
+            model = model_class.from_pretrained(
+                model_id,
+                **_dtype_kwargs(torch.float16),
+                device_map="auto",
+                trust_remote_code=True,
+            )
+    else:
+        if cpu_mode not in CPU_MODES:
+            raise ValueError(f"Unknown CPU mode {cpu_mode!r}, expected one of {CPU_MODES}")
+        num_threads = NUM_THREADS if num_threads is None else num_threads
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        # int8 also loads in bf16 first: each linear is quantized from it, so float32
+        # weights never exist for the whole model at once
+        if cpu_mode == "float32" or not cpu_supports_bf16() and cpu_mode == "bfloat16":
+            dtype = torch.float32
+        else:
+            dtype = torch.bfloat16
+        with timed("load_weights", model_id):
+            model = model_class.from_pretrained(
+                model_id,
+                **_dtype_kwargs(dtype),
+                low_cpu_mem_usage=True,
+                trust_remote_code=True,
+            )
+        if cpu_mode == "int8":
+            progress("Quantizing linear layers to int8")
+            with timed("quantize", model_id):
+                _quantize_linear_int8(model)
+                model.float()   # quantized linears take float32 activations
+    model.eval()
+
+    if do_warmup:
+        progress("Warming up")
+        with timed("warmup", model_id):
+            warmup(processor, model)
+    return processor, model
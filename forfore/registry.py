@@ -0,0 +1,266 @@
+"""Keeps loaded models within a memory budget, unloading idle ones in LRU order."""
+import gc
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+GB = 1024**3
+
+
+class ModelBudgetExceeded(RuntimeError):
+    """A model cannot be loaded without going over the memory budget."""
+
+
+def default_budget_bytes() -> int:
+    """FORFORE_MODEL_MEMORY_GB if set, else 75% of physical RAM."""
+    if "FORFORE_MODEL_MEMORY_GB" in os.environ:
+        return int(float(os.environ["FORFORE_MODEL_MEMORY_GB"]) * GB)
+    return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.75)
+
+
+@dataclass
+class _Slot:
+    model_id: str
+    cpu_mode: str
+    state: str = "loading"        # loading | ready
+    phase: str = "Queued"         # current loading step, for progress display
+    started: float = field(default_factory=time.monotonic)
+    processor: Any = None
+    model: Any = None
+    nbytes: int = 0
+    refs: int = 0                 # sessions waiting for or generating with this model
+    last_used: float = field(default_factory=time.monotonic)
+    ready: threading.Event = field(default_factory=threading.Event)
+    error: Optional[BaseException] = None
+    kv_store: Any = None          # SessionKVCache, created by ModelRegistry.caches on first use
+    image_cache: Any = None       # ImageFeatureCache, likewise
+
+    @property
+    def reserved(self) -> int:
+        """Weights plus the size caps of the model's caches, as counted against the budget."""
+        return self.nbytes + sum(c.max_bytes for c in (self.kv_store, self.image_cache) if c is not None)
+
+
+def _noop(message: str) -> None:
+    pass
+
+
+class ModelRegistry:
+    """
+    Loads models on demand and unloads the least recently used idle ones when
+    a new model would not fit in `budget_bytes`. A model is pinned while any
+    caller is inside `use()`, so it is never freed mid-generation. Each
+    model's KV and image-feature caches live in its slot: their size caps
+    count against the budget and they are dropped with the model.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, loader: Optional[Callable] = None,
+                 estimator: Optional[Callable] = None, validator: Optional[Callable] = None,
+                 kv_cache_bytes: int = 2 * GB, image_cache_bytes: int = GB // 2):
+        from forfore import models
+
+        self.budget_bytes = budget_bytes if budget_bytes is not None else default_budget_bytes()
+        self.kv_cache_bytes = kv_cache_bytes
+        self.image_cache_bytes = image_cache_bytes
+        self._loader = loader or models.load_processor_and_model
+        self._estimator = estimator or models.estimate_model_bytes
+        # Raises for a model id that cannot be loaded; checked before a load of unknown size
+        self._validator = validator or models.model_config
+        self._slots: "dict[tuple, _Slot]" = {}
+        self._errors: "dict[tuple, BaseException]" = {}   # last failed load per model
+        self._events: "deque[tuple[float, str]]" = deque(maxlen=20)   # (time, message), e.g. evictions
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> list:
+        """(model_id, cpu_mode, state, reserved bytes, refs) for every known model."""
+        with self._lock:
+            return [(s.model_id, s.cpu_mode, s.state, s.reserved, s.refs) for s in self._slots.values()]
+
+    def recent_events(self, within: float = 300.0) -> list:
+        """(seconds ago, message) for evictions in the last `within` seconds, newest first."""
+        now = time.time()
+        return [(now - at, message) for at, message in reversed(self._events) if now - at <= within]
+
+    def caches(self, model_id: str, cpu_mode: str = "bfloat16") -> tuple:
+        """
+        (SessionKVCache, ImageFeatureCache) of a loaded model, created on first
+        call; (None, None) if the model is not loaded. Call inside `use()` so
+        the model cannot be evicted meanwhile.
+        """
+        from forfore.image_cache import ImageFeatureCache
+        from forfore.kv_cache import SessionKVCache
+
+        key = (model_id, cpu_mode)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None or slot.state != "ready":
+                return None, None
+            if slot.kv_store is None:
+                slot.kv_store = SessionKVCache(max_bytes=self.kv_cache_bytes)
+                slot.image_cache = ImageFeatureCache(max_bytes=self.image_cache_bytes)
+                try:
+                    self._make_room(slot.reserved, key, _noop)
+                except ModelBudgetExceeded:
+                    pass   # as after a low estimate: over budget until another model goes idle
+            return slot.kv_store, slot.image_cache
+
+    def is_ready(self, model_id: str, cpu_mode: str = "bfloat16") -> bool:
+        slot = self._slots.get((model_id, cpu_mode))
+        return slot is not None and slot.state == "ready"
+
+    def processor_for(self, model_id: str, cpu_mode: str = "bfloat16"):
+        """The loaded model's processor, or None; handy for token counting outside `use()`."""
+        slot = self._slots.get((model_id, cpu_mode))
+        return slot.processor if slot is not None and slot.state == "ready" else None
+
+    def progress(self, model_id: str, cpu_mode: str = "bfloat16") -> Optional[tuple]:
+        """(phase, seconds since loading started) while the model is loading, else None."""
+        slot = self._slots.get((model_id, cpu_mode))
+        if slot is None or slot.state != "loading":
+            return None
+        return slot.phase, time.monotonic() - slot.started
+
+    def load_error(self, model_id: str, cpu_mode: str = "bfloat16") -> Optional[BaseException]:
+        return self._errors.get((model_id, cpu_mode))
+
+    def clear_error(self, model_id: str, cpu_mode: str = "bfloat16") -> None:
+        self._errors.pop((model_id, cpu_mode), None)
+
+    def load_in_background(self, model_id: str, cpu_mode: str = "bfloat16") -> None:
+        """
+        Start loading on a daemon thread and return immediately. Does nothing if
+        the model is already loaded or loading, or its last load failed (see
+        `clear_error`).
+        """
+        key = (model_id, cpu_mode)
+        with self._lock:
+            if key in self._slots or key in self._errors:
+                return
+
+        def _load():
+            try:
+                with self.use(model_id, cpu_mode):
+                    pass
+            except BaseException:
+                pass   # recorded in self._errors by _acquire
+
+        threading.Thread(target=_load, name=f"load-{model_id}", daemon=True).start()
+
+    def _make_room(self, needed: int, keep: tuple, notify) -> None:
+        """Evict idle models until `needed` more bytes fit. Call with the lock held."""
+        if needed > self.budget_bytes:
+            raise ModelBudgetExceeded(
+                f"{keep[0]} needs about {needed / GB:.1f} GB, more than the {self.budget_bytes / GB:.1f} GB model budget"
+            )
+        idle = sorted(
+            (s for k, s in self._slots.items() if k != keep and s.refs == 0 and s.state == "ready"),
+            key=lambda s: s.last_used,
+        )
+        used = sum(s.reserved for k, s in self._slots.items() if k != keep)
+        while idle and used + needed > self.budget_bytes:
+            victim = idle.pop(0)
+            message = f"Evicted {victim.model_id} ({victim.cpu_mode}) to free {victim.reserved / GB:.1f} GB"
+            # Recorded as well, since background loads have nobody to notify
+            self._events.append((time.time(), message))
+            notify(message)
+            del self._slots[(victim.model_id, victim.cpu_mode)]
+            used -= victim.reserved
+            victim.processor = victim.model = victim.kv_store = victim.image_cache = None
+        if used + needed > self.budget_bytes:
+            raise ModelBudgetExceeded(
+                f"Not enough memory for {keep[0]} while other models are generating, please retry shortly"
+            )
+
+    def _release_memory(self) -> None:
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _acquire(self, model_id: str, cpu_mode: str, notify) -> _Slot:
+        key = (model_id, cpu_mode)
+        with self._lock:
+            self._errors.pop(key, None)
+            slot = self._slots.get(key)
+            owner = slot is None
+            if owner:
+                slot = self._slots[key] = _Slot(model_id, cpu_mode)
+            slot.refs += 1
+
+        if not owner:
+            slot.ready.wait()
+            if slot.error is not None:
+                raise slot.error
+            return slot
+
+        try:
+            estimate = self._estimator(model_id, cpu_mode)
+            if estimate is None:
+                # Unknown size: make sure the id loads at all, then load without evicting
+                # anything and hold the model to the budget by its real footprint below
+                self._validator(model_id)
+            else:
+                with self._lock:
+                    self._make_room(estimate, key, notify)
+                    slot.nbytes = estimate
+                self._release_memory()
+            notify(f"Loading {model_id}…")
+            slot.processor, slot.model = self._loader(
+                model_id, cpu_mode=cpu_mode, progress=lambda phase: setattr(slot, "phase", phase),
+            )
+            from forfore.models import model_footprint
+
+            slot.nbytes = max(slot.nbytes, model_footprint(slot.model))
+            with self._lock:
+                if slot.nbytes > self.budget_bytes:
+                    raise ModelBudgetExceeded(
+                        f"{model_id} takes {slot.nbytes / GB:.1f} GB, more than the {self.budget_bytes / GB:.1f} GB model budget"
+                    )
+                slot.state = "ready"
+                # The estimate may have been low or missing; evict idle models if the real size does not fit
+                try:
+                    self._make_room(slot.reserved, key, notify)
+                except ModelBudgetExceeded:
+                    pass
+        except BaseException as e:
+            with self._lock:
+                self._slots.pop(key, None)
+                self._errors[key] = e
+            slot.error = e
+            slot.processor = slot.model = None
+            raise
+        finally:
+            slot.ready.set()
+        return slot
+
+    @contextmanager
+    def use(self, model_id: str, cpu_mode: str = "bfloat16", notify: Callable[[str], Any] = _noop):
+        """Yield (processor, model), loading it first if needed, and pin it until the block exits."""
+        slot = self._acquire(model_id, cpu_mode, notify)
+        try:
+            yield slot.processor, slot.model
+        finally:
+            with self._lock:
+                slot.refs -= 1
+                slot.last_used = time.monotonic()
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """The process-wide registry, shared by every page and session."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
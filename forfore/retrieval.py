@@ -0,0 +1,379 @@
+"""
+Embeddings and a memory-mapped vector index for retrieval-augmented replies.
+
+Texts are embedded on CPU by a small sentence-embedding model
+(FORFORE_EMBEDDING_MODEL, multilingual so Korean and English questions
+land in the same space) or, with FORFORE_EMBEDDING_MODEL=hash, by a
+model-free hashing embedder for offline runs and tests.
+
+`update_index` keeps one float32 matrix per corpus in an .npy file, keyed by
+a hash of each text: on rebuild only new or changed texts are embedded, the
+rest are copied from the previous file. The matrix is opened with
+mmap_mode="r", so sessions share the page cache instead of each holding a
+copy. Search is an exact dot product over all rows or a candidate subset;
+with `ann=True` large indexes also get an IVF coarse quantizer (k-means
+lists, `nprobe` probed per query) stored next to the matrix.
+
+`SlotIndex` is for corpora that change a few rows at a time, like the job
+board: vectors live in an append-only file and rows point at slots in it,
+so an update embeds and appends only the changed rows instead of
+re-hashing the corpus and rewriting the matrix.
+"""
+import hashlib
+import json
+import os
+import uuid
+import zlib
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get("FORFORE_EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+INDEX_DIR = os.environ.get("FORFORE_INDEX_DIR", ".forfore_index")
+ANN_MIN_ROWS = 50_000      # below this, exact search is fast enough
+COMPACT_FRACTION = 0.25    # unused slots above this share of a slot file are compacted away
+
+
+class HashingEmbedder:
+    """Bag of hashed search tokens (see forfore.job_search.tokenize); no model, stable across processes."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def embed(self, texts: Sequence[str], kind: str = "passage") -> np.ndarray:
+        from forfore.job_search import tokenize
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                vectors[row, zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        return _normalize(vectors)
+
+
+class TransformerEmbedder:
+    """
+    Mean-pooled sentence embeddings from a Hugging Face encoder. E5 models
+    expect "query: " / "passage: " prefixes, which are added automatically.
+    """
+
+    def __init__(self, model_id: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 32, max_length: int = 256):
+        from transformers import AutoModel, AutoTokenizer
+
+        self.name = model_id
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModel.from_pretrained(model_id).eval()
+        self.dim = self.model.config.hidden_size
+        self._prefixed = "e5" in model_id.lower()
+
+    def embed(self, texts: Sequence[str], kind: str = "passage") -> np.ndarray:
+        import torch
+
+        if self._prefixed:
+            texts = [f"{kind}: {text}" for text in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        with torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(
+                    list(texts[start:start + self.batch_size]), padding=True, truncation=True,
+                    max_length=self.max_length, return_tensors="pt",
+                )
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+                out[start:start + len(pooled)] = pooled.float().numpy()
+        return _normalize(out)
+
+
+@lru_cache(maxsize=None)
+def get_embedder(name: str = DEFAULT_EMBEDDING_MODEL):
+    """One embedder per model id for the whole process."""
+    if name == "hash" or name.startswith("hash-"):
+        return HashingEmbedder(int(name.split("-")[1]) if "-" in name else 512)
+    return TransformerEmbedder(name)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def text_key(text: str, embedder_name: str) -> str:
+    return hashlib.sha256(f"{embedder_name}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class VectorIndex:
+    """Unit-length float32 vectors (often an np.memmap) with one key per row."""
+
+    def __init__(self, vectors: np.ndarray, keys: list, ivf: Optional[dict] = None):
+        self.vectors = vectors
+        self.keys = keys
+        self.ivf = ivf          # {"centroids": (nlist, dim), "lists": [row arrays]}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VectorIndex"]:
+        """Open `path`.npy memory-mapped; None if it does not exist yet."""
+        if not os.path.exists(f"{path}.npy"):
+            return None
+        with open(f"{path}.keys.json") as f:
+            keys = json.load(f)
+        vectors = np.load(f"{path}.npy", mmap_mode="r")
+        ivf = None
+        if os.path.exists(f"{path}.ivf.npz"):
+            data = np.load(f"{path}.ivf.npz")
+            if str(data["fingerprint"]) == _fingerprint(keys):
+                assign = data["assign"]
+                order = np.argsort(assign, kind="stable")
+                bounds = np.searchsorted(assign[order], np.arange(len(data["centroids"]) + 1))
+                ivf = {"centroids": data["centroids"], "lists": [order[a:b] for a, b in zip(bounds, bounds[1:])]}
+        return cls(vectors, keys, ivf)
+
+    def search(self, query: np.ndarray, k: int, candidates: Optional[np.ndarray] = None,
+               nprobe: int = 8) -> "tuple[np.ndarray, np.ndarray]":
+        """(row positions, cosine scores) of the `k` nearest rows, optionally only among `candidates`."""
+        rows = candidates
+        if self.ivf is not None and (candidates is None or len(candidates) > ANN_MIN_ROWS):
+            nearest = np.argsort(-(self.ivf["centroids"] @ query))[:nprobe]
+            probed = np.concatenate([self.ivf["lists"][c] for c in nearest])
+            rows = probed if candidates is None else probed[np.isin(probed, candidates)]
+        if rows is None:
+            rows = np.arange(len(self))
+        else:
+            rows = np.sort(rows)    # sequential reads from the memory map
+        scores = self._scores(query, rows, every_row=candidates is None and self.ivf is None)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray, every_row: bool) -> np.ndarray:
+        if every_row:
+            return np.asarray(self.vectors @ query)
+        return np.asarray(self.vectors[rows] @ query)
+
+
+class SlotFile:
+    """
+    The append-only vector file behind `SlotIndex` versions: `path`.f32 holds
+    one float32 vector per slot and `path`.keys a JSON header line followed
+    by each slot's text key. Appending never disturbs memory maps that
+    older versions hold; only `compact` replaces the files.
+    """
+
+    def __init__(self, path: str, embedder, batch_size: int = 4096):
+        self.path = path
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.batch_size = batch_size
+        self.keys: list = []
+        self.header: dict = {}
+        try:
+            with open(f"{path}.keys") as f:
+                self.header = json.loads(f.readline())
+                keys = f.read().splitlines()
+        except (OSError, ValueError):
+            keys = []
+        if self.header.get("embedder") != embedder.name or self.header.get("dim") != self.dim:
+            self._rewrite([], np.zeros((0, self.dim), dtype=np.float32))
+        else:
+            stored = os.path.getsize(f"{path}.f32") // (4 * self.dim) if os.path.exists(f"{path}.f32") else 0
+            self.keys = keys[:stored]
+            if len(keys) != stored or stored * 4 * self.dim != os.path.getsize(f"{path}.f32"):
+                # An append was cut short: keep the slots both files agree on
+                self._rewrite(self.keys, self.vectors())
+        self.slot_of = {key: slot for slot, key in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def vectors(self) -> np.ndarray:
+        """Memory map over the slots written so far."""
+        if not self.keys:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(f"{self.path}.f32", dtype=np.float32, mode="r", shape=(len(self.keys), self.dim))
+
+    def add(self, texts: Sequence[str]) -> np.ndarray:
+        """Slots for `texts`, embedding and appending the ones no slot holds yet."""
+        keys = [text_key(text, self.embedder.name) for text in texts]
+        missing = {}
+        for row, key in enumerate(keys):
+            if key not in self.slot_of and key not in missing:
+                missing[key] = row
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            vectors = self.embedder.embed([texts[row] for _, row in batch], kind="passage")
+            # Vectors first: a crash in between leaves extra vectors, which __init__ drops
+            with open(f"{self.path}.f32", "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(f"{self.path}.keys", "a") as f:
+                f.write("".join(f"{key}\n" for key, _ in batch))
+            for key, _ in batch:
+                self.slot_of[key] = len(self.keys)
+                self.keys.append(key)
+        return np.fromiter((self.slot_of[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def compact(self, slots: np.ndarray) -> np.ndarray:
+        """Drop every slot not in `slots`; returns `slots` renumbered."""
+        live, renumbered = np.unique(slots, return_inverse=True)
+        self._rewrite([self.keys[slot] for slot in live], self.vectors(), live)
+        self.slot_of = {key: slot for slot, key in enumerate(self.keys)}
+        return renumbered.astype(np.int64)
+
+    def _rewrite(self, keys: list, vectors: np.ndarray, take: Optional[np.ndarray] = None) -> None:
+        """Replace both files atomically with `keys` and their vectors (rows `take` of `vectors`)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # A new generation tells saved IVF assignments that slot numbers changed
+        self.header = {"embedder": self.embedder.name, "dim": self.dim, "generation": uuid.uuid4().hex}
+        take = np.arange(len(keys)) if take is None else take
+        with open(f"{self.path}.f32.tmp", "wb") as f:
+            for start in range(0, len(take), 65536):
+                f.write(np.ascontiguousarray(vectors[take[start:start + 65536]], dtype=np.float32).tobytes())
+        with open(f"{self.path}.keys.tmp", "w") as f:
+            f.write(json.dumps(self.header) + "\n" + "".join(f"{key}\n" for key in keys))
+        os.replace(f"{self.path}.f32.tmp", f"{self.path}.f32")
+        os.replace(f"{self.path}.keys.tmp", f"{self.path}.keys")
+        self.keys = list(keys)
+
+
+class SlotIndex(VectorIndex):
+    """
+    One version of a corpus stored in a `SlotFile`: row i's vector is slot
+    `slots[i]`. `updated` returns the next version; older versions stay
+    searchable until dropped.
+    """
+
+    def __init__(self, store: SlotFile, slots: np.ndarray, ivf: Optional[dict] = None):
+        super().__init__(store.vectors(), store.keys, None)
+        self.store = store
+        self.slots = slots
+        self.slot_ivf = ivf     # {"centroids", "assign": cluster of every slot}
+        if ivf is not None:
+            assign = ivf["assign"][slots]
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(ivf["centroids"]) + 1))
+            self.ivf = {"centroids": ivf["centroids"], "lists": [order[a:b] for a, b in zip(bounds, bounds[1:])]}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @classmethod
+    def build(cls, path: str, texts: Sequence[str], embedder, ann: bool = False) -> "SlotIndex":
+        """Index `texts` (row i = texts[i]), reusing the vectors stored at `path`."""
+        store = SlotFile(path, embedder)
+        return cls._finish(store, store.add(texts), _load_slot_ivf(store) if ann else None, ann)
+
+    def updated(self, remap: np.ndarray, changed: np.ndarray, texts: Sequence[str], ann: bool = False) -> "SlotIndex":
+        """
+        The next version: old row r moved to `remap[r]` (-1 if gone) and rows
+        `changed` now hold `texts`. Only those texts are looked up or embedded.
+        """
+        size = int(max(remap.max(initial=-1), changed.max(initial=-1))) + 1
+        slots = np.full(size, -1, dtype=np.int64)
+        kept = remap >= 0
+        slots[remap[kept]] = self.slots[kept]
+        slots[changed] = self.store.add(texts)
+        if (slots < 0).any():
+            raise ValueError("every row must be either kept or changed")
+        return self._finish(self.store, slots, self.slot_ivf if ann else None, ann)
+
+    @classmethod
+    def _finish(cls, store: SlotFile, slots: np.ndarray, ivf: Optional[dict], ann: bool) -> "SlotIndex":
+        if len(store) - len(np.unique(slots)) > COMPACT_FRACTION * len(store):
+            slots, ivf = store.compact(slots), None
+        if not ann or len(slots) < ANN_MIN_ROWS:
+            return cls(store, slots)
+        if ivf is not None and len(ivf["assign"]) == len(store):
+            return cls(store, slots, ivf)
+        vectors = store.vectors()
+        if ivf is None:
+            centroids, assign = _kmeans(vectors, nlist=int(np.sqrt(len(slots))))
+            ivf = {"centroids": centroids, "assign": assign}
+        else:
+            # New slots join their nearest existing list; lists are retrained on compaction
+            fresh = np.argmax(np.asarray(vectors[len(ivf["assign"]):]) @ ivf["centroids"].T, axis=1)
+            ivf = {"centroids": ivf["centroids"], "assign": np.concatenate([ivf["assign"], fresh.astype(np.int32)])}
+        np.savez(f"{store.path}.ivf.tmp.npz", generation=store.header["generation"], **ivf)
+        os.replace(f"{store.path}.ivf.tmp.npz", f"{store.path}.ivf.npz")
+        return cls(store, slots, ivf)
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray, every_row: bool) -> np.ndarray:
+        if every_row:
+            # One pass over the file (unused slots included) beats gathering every row
+            return np.asarray(self.vectors @ query)[self.slots]
+        return np.asarray(self.vectors[self.slots[rows]] @ query)
+
+
+def _load_slot_ivf(store: SlotFile) -> Optional[dict]:
+    """The saved IVF lists of `store`, if they belong to its current slot numbering."""
+    try:
+        data = np.load(f"{store.path}.ivf.npz")
+    except (OSError, ValueError):
+        return None
+    if str(data["generation"]) != store.header.get("generation") or len(data["assign"]) > len(store):
+        return None
+    return {"centroids": data["centroids"], "assign": data["assign"]}
+
+
+def _fingerprint(keys: list) -> str:
+    return hashlib.sha256("".join(keys).encode("ascii")).hexdigest()
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iters: int = 10, sample: int = 20_000, seed: int = 0):
+    """Spherical k-means on a sample; returns (centroids, assignment of every row)."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+    train = np.asarray(vectors[np.sort(picks)])
+    centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+    for _ in range(iters):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = train[assign == c]
+            if len(members):
+                centroids[c] = members.sum(0)
+        centroids = _normalize(centroids)
+    assign = np.concatenate([
+        np.argmax(np.asarray(vectors[i:i + 65536]) @ centroids.T, axis=1) for i in range(0, len(vectors), 65536)
+    ])
+    return centroids.astype(np.float32), assign.astype(np.int32)
+
+
+def update_index(path: str, texts: Sequence[str], embedder, ann: bool = False) -> VectorIndex:
+    """
+    Index `texts` (row i = texts[i]) at `path`, embedding only texts that the
+    existing index does not already hold. Files are replaced atomically, so
+    readers of the previous memory map are unaffected.
+    """
+    keys = [text_key(text, embedder.name) for text in texts]
+    old = VectorIndex.load(path)
+    if old is not None and old.keys == keys and (old.ivf is not None or not ann or len(keys) < ANN_MIN_ROWS):
+        return old
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    known = {key: row for row, key in enumerate(old.keys)} if old is not None and old.vectors.shape[1:] == (embedder.dim,) else {}
+    missing = [row for row, key in enumerate(keys) if key not in known]
+    vectors = np.empty((len(keys), embedder.dim), dtype=np.float32)
+    reused = [row for row, key in enumerate(keys) if key in known]
+    if reused:
+        vectors[reused] = old.vectors[[known[keys[row]] for row in reused]]
+    if missing:
+        vectors[missing] = embedder.embed([texts[row] for row in missing], kind="passage")
+
+    np.save(f"{path}.tmp.npy", vectors)
+    with open(f"{path}.keys.json.tmp", "w") as f:
+        json.dump(keys, f)
+    os.replace(f"{path}.tmp.npy", f"{path}.npy")
+    os.replace(f"{path}.keys.json.tmp", f"{path}.keys.json")
+    if ann and len(keys) >= ANN_MIN_ROWS:
+        centroids, assign = _kmeans(vectors, nlist=int(np.sqrt(len(keys))))
+        np.savez(f"{path}.ivf.tmp.npz", centroids=centroids, assign=assign, fingerprint=_fingerprint(keys))
+        os.replace(f"{path}.ivf.tmp.npz", f"{path}.ivf.npz")
+    return VectorIndex.load(path)
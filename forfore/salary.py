@@ -0,0 +1,130 @@
+"""
+Parse free-text salaries ("₩10,000 per hour", "₩40M–₩60M per year",
+"월 250만원") into numbers that can be filtered and sorted.
+
+Each listing gets a min/max amount in won, the pay period, and the same
+range converted to a monthly figure (and an hourly one) so that hourly
+part-time jobs and annual salaries can be compared. Periods that cannot be
+converted ("Negotiable per project") stay NaN.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+# Korean labour-law conventions: 209 paid hours (40h/week incl. weekly holiday pay)
+# and about 21.75 working days per month
+HOURS_PER_MONTH = 209
+DAYS_PER_MONTH = 21.75
+TO_MONTHLY = {"hour": HOURS_PER_MONTH, "day": DAYS_PER_MONTH, "week": 52 / 12, "month": 1, "year": 1 / 12}
+
+# A number with its currency sign and unit; only numbers with at least one of them are pay
+_AMOUNT_RE = re.compile(
+    r"(₩|krw)?\s*(\d[\d,]*(?:\.\d+)?)\s*(억|천만|만|천|[KkMm](?![a-z]))?\s*(원|won\b|krw\b)?", re.IGNORECASE
+)
+_RANGE_RE = re.compile(r"\s*[-–~]\s*(?:₩|krw)?\s*", re.IGNORECASE)
+_UNITS = {None: 1, "k": 1e3, "m": 1e6, "천": 1e3, "만": 1e4, "천만": 1e7, "억": 1e8}
+_PERIODS = (
+    ("hour", re.compile(r"hour|hr\b|시급|시간")),
+    ("day", re.compile(r"\bday\b|daily|일급|일당")),
+    ("week", re.compile(r"week|주급")),
+    ("month", re.compile(r"month|월")),
+    ("year", re.compile(r"year|annual|연봉|년")),
+    ("project", re.compile(r"project|건당|프로젝트")),
+)
+
+
+def parse_salary(text: str) -> tuple:
+    """(min_won, max_won, period) for `text`; amounts are NaN and period None when unknown."""
+    text = str(text or "")
+    lowered = text.lower()
+    period = next((name for name, pattern in _PERIODS if pattern.search(lowered)), None)
+    # (value, unit multiplier or None, marked) per number; "주 5일" has no marker, so 5 is not pay
+    numbers = [
+        (float(m[2].replace(",", "")), _UNITS[m[3].lower()] if m[3] else None, bool(m[1] or m[3] or m[4]), m)
+        for m in _AMOUNT_RE.finditer(text)
+    ]
+    amounts = []
+    for i, (value, unit, marked, match) in enumerate(numbers):
+        # The other end of a range lends its marker and unit: "40-60M", "₩9,500-10,000"
+        for j in (i + 1, i - 1):
+            if marked or not 0 <= j < len(numbers) or not numbers[j][2]:
+                continue
+            first, second = sorted((match, numbers[j][3]), key=lambda m: m.start())
+            if _RANGE_RE.fullmatch(text, first.end(), second.start(2)):
+                marked, unit = True, unit or numbers[j][1]
+        if marked:
+            amounts.append(value * (unit or 1))
+    if not amounts:
+        return math.nan, math.nan, period
+    return min(amounts[:2]), max(amounts[:2]), period
+
+
+def salary_columns(salaries: pd.Series) -> pd.DataFrame:
+    """salary_min/max (won), salary_period and the monthly/hourly-normalized range per listing."""
+    parsed = pd.DataFrame(
+        [parse_salary(text) for text in salaries], index=salaries.index,
+        columns=["salary_min", "salary_max", "salary_period"],
+    ).astype({"salary_min": float, "salary_max": float, "salary_period": object})
+    factor = parsed["salary_period"].map(TO_MONTHLY).astype(float)
+    parsed["salary_monthly_min"] = parsed["salary_min"] * factor
+    parsed["salary_monthly_max"] = parsed["salary_max"] * factor
+    parsed["salary_hourly_min"] = parsed["salary_monthly_min"] / HOURS_PER_MONTH
+    parsed["salary_hourly_max"] = parsed["salary_monthly_max"] / HOURS_PER_MONTH
+    return parsed
+
+
+def sort_keys(df: pd.DataFrame) -> "dict[str, np.ndarray]":
+    """Per sort order, the key whose stable ascending sort gives that order."""
+    pay = ((df["salary_monthly_min"] + df["salary_monthly_max"]) / 2).to_numpy(dtype=float)
+    known = ~np.isnan(pay)
+    return {
+        "Newest": -df["posted"].to_numpy().astype("int64"),
+        "Highest pay": np.where(known, -pay, np.inf),
+        "Lowest pay": np.where(known, pay, np.inf),
+    }
+
+
+def sort_orders(df: pd.DataFrame) -> "dict[str, np.ndarray]":
+    """
+    Row positions pre-sorted once per snapshot. Ordering a filtered result is
+    then `order[mask[order]]`, a linear pass with no per-rerun sort.
+    Listings without a comparable salary go last in both pay orders.
+    """
+    return {name: np.argsort(key, kind="stable") for name, key in sort_keys(df).items()}
+
+
+def update_sort_orders(orders: dict, df: pd.DataFrame, remap: np.ndarray, changed: np.ndarray) -> dict:
+    """
+    `sort_orders(df)` for the listings after a refresh, derived from the
+    previous orders: unchanged rows keep their relative order and only the
+    `changed` rows are placed by binary search (see JobSearchIndex.updated
+    for `remap` / `changed`).
+    """
+    keys = sort_keys(df)
+    changed = np.asarray(changed, dtype=np.int64)
+    fresh = np.zeros(len(df), dtype=bool)
+    fresh[changed] = True
+    result = {}
+    for name, order in orders.items():
+        key = keys[name]
+        moved = remap[order]
+        moved = moved[moved >= 0]
+        moved = moved[~fresh[moved]]
+        # Ties are broken by row position, as in the stable full sort
+        new_rows = changed[np.lexsort((changed, key[changed]))]
+        sorted_keys = key[moved]
+        lo = np.searchsorted(sorted_keys, key[new_rows], side="left")
+        hi = np.searchsorted(sorted_keys, key[new_rows], side="right")
+        at = [l + np.searchsorted(moved[l:h], row) for l, h, row in zip(lo, hi, new_rows)]
+        result[name] = np.insert(moved, np.asarray(at, dtype=np.int64), new_rows)
+    return result
+
+
+def format_won(amount: float) -> str:
+    if math.isnan(amount):
+        return "–"
+    if amount >= 1e6:
+        return f"₩{amount / 1e6:.1f}M"
+    return f"₩{amount:,.0f}"
@@ -0,0 +1,276 @@
+"""
+Standalone inference worker that micro-batches requests from all chat sessions.
+
+Start it next to Streamlit:
+
+    python -m forfore.worker --model-id unsloth/Llama-3.2-11B-Vision-Instruct --port 8765
+
+and point the chatbot page at it with FORFORE_WORKER_ADDRESS=127.0.0.1:8765.
+Both sides must share a secret in FORFORE_WORKER_AUTHKEY: connections carry
+pickled data, so neither side starts without one. Besides generation
+requests, an {"op": "info"} message returns the id of the served model.
+Requests that arrive within `max_wait` seconds of each other are padded into
+one `model.generate` call; when more than `max_queue` requests are waiting,
+new ones are rejected with WorkerBusy instead of piling up.
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Client, Listener
+from typing import Optional
+
+DEFAULT_PORT = 8765
+AUTHKEY_ENV = "FORFORE_WORKER_AUTHKEY"
+
+
+class WorkerBusy(RuntimeError):
+    """The worker queue is full; the caller should retry later."""
+
+
+def worker_authkey() -> bytes:
+    """The shared secret from FORFORE_WORKER_AUTHKEY; there is deliberately no default."""
+    key = os.environ.get(AUTHKEY_ENV, "")
+    if not key:
+        raise RuntimeError(
+            f"{AUTHKEY_ENV} is not set. Set it to the same random secret for the worker and the app, "
+            f"e.g. {AUTHKEY_ENV}=$(python -c 'import secrets; print(secrets.token_hex(32))')"
+        )
+    return key.encode()
+
+
+def parse_address(address: str) -> tuple:
+    """'host:port' -> (host, port)."""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+@dataclass
+class _Request:
+    user_text: str
+    image: Optional[bytes]
+    history: list
+    max_new_tokens: int
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[dict] = None
+
+
+class InferenceWorker:
+    """Owns the model and runs queued requests in padded batches."""
+
+    def __init__(self, processor, model, max_batch_size: int = 8, max_wait: float = 0.05, max_queue: int = 64):
+        self.processor = processor
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[_Request]" = queue.Queue(maxsize=max_queue)
+        self._carry: list = []   # requests pulled from the queue that did not fit the last batch
+        # Left padding keeps every prompt flush against its generated tokens
+        getattr(processor, "tokenizer", processor).padding_side = "left"
+
+    def submit(self, request: _Request) -> None:
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise WorkerBusy(f"Inference queue is full ({self._queue.maxsize} waiting), please retry") from None
+
+    def _collect(self) -> list:
+        """Block for one request, then gather compatible ones until the wait window closes."""
+        first = self._carry.pop(0) if self._carry else self._queue.get()
+        has_image = first.image is not None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self._carry:
+                req = self._carry.pop(0)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            # Text-only and image prompts are processed differently, so never mix them
+            if (req.image is not None) == has_image:
+                batch.append(req)
+            else:
+                self._carry.append(req)
+                break
+        return batch
+
+    def _run_batch(self, batch: list) -> None:
+        import torch
+
+        from forfore.generation import build_messages
+        from forfore.images import load_image, processor_limits
+
+        from forfore.metrics import model_label, timed
+
+        processor = self.processor
+        label = model_label(self.model)
+        kwargs = dict(return_tensors="pt", padding=True)
+        if batch[0].image is not None:
+            images, decoded = [], []
+            with timed("image_decode", label):
+                limits = processor_limits(processor)
+                for r in batch:
+                    # A broken upload fails only its own request; the rest are batched without it
+                    try:
+                        images.append([load_image(r.image, *limits)])
+                    except Exception as e:
+                        r.result = {"error": f"{type(e).__name__}: {e}"}
+                    else:
+                        decoded.append(r)
+            batch = decoded
+            if not batch:
+                return
+            kwargs["images"] = images
+        with timed("chat_template", label):
+            kwargs["text"] = [
+                processor.apply_chat_template(
+                    build_messages(r.user_text, r.image is not None, r.history), add_generation_prompt=True
+                )
+                for r in batch
+            ]
+        with timed("processor", label):
+            inputs = processor(**kwargs)
+        with timed("to_device", label):
+            inputs = inputs.to(self.model.device)
+
+        with timed("generate", label), torch.no_grad():
+            out_ids = self.model.generate(**inputs, max_new_tokens=max(r.max_new_tokens for r in batch))
+
+        new_ids = out_ids[:, inputs["input_ids"].shape[1]:]
+        pad_id = getattr(processor, "tokenizer", processor).pad_token_id
+        for row, req in zip(new_ids, batch):
+            row = row[:req.max_new_tokens]
+            req.result = {
+                "text": processor.decode(row, skip_special_tokens=True).strip(),
+                "new_tokens": int((row != pad_id).sum()) if pad_id is not None else len(row),
+                "batch_size": len(batch),
+            }
+
+    def run_forever(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for req in batch:
+                    if req.result is None:   # requests with a bad image already carry their own error
+                        req.result = {"error": f"{type(e).__name__}: {e}"}
+            for req in batch:
+                req.done.set()
+
+    def _handle(self, conn) -> None:
+        with conn:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+            if msg.get("op") == "info":
+                from forfore.metrics import model_label
+
+                conn.send({"model_id": model_label(self.model)})
+                return
+            req = _Request(**msg)
+            try:
+                self.submit(req)
+            except WorkerBusy as e:
+                conn.send({"error": str(e), "busy": True})
+                return
+            req.done.wait()
+            conn.send(req.result)
+
+    def serve(self, address: tuple, authkey: Optional[bytes] = None) -> None:
+        """Accept client connections forever; one short-lived connection per request."""
+        authkey = authkey or worker_authkey()
+        threading.Thread(target=self.run_forever, daemon=True).start()
+        with Listener(address, backlog=128, authkey=authkey) as listener:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+class WorkerClient:
+    """Used by the chatbot page in place of a local model."""
+
+    def __init__(self, address: tuple, authkey: Optional[bytes] = None, timeout: float = 600):
+        self.address = address
+        self.authkey = authkey or worker_authkey()
+        self.timeout = timeout
+
+    def model_id(self) -> str:
+        """Id of the model the worker serves; the page's model settings do not apply to it."""
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send({"op": "info"})
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Inference worker did not answer within {self.timeout:.0f}s")
+            return conn.recv()["model_id"]
+
+    def generate_reply(self, user_text: str, image_file, max_new_tokens: int = 256, stats=None, history=()) -> str:
+        from forfore.image_cache import read_image_bytes
+
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send({
+                "user_text": user_text,
+                "image": read_image_bytes(image_file) if image_file is not None else None,
+                "history": list(history),
+                "max_new_tokens": max_new_tokens,
+            })
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Inference worker did not answer within {self.timeout:.0f}s")
+            result = conn.recv()
+
+        if result.get("busy"):
+            raise WorkerBusy(result["error"])
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        if stats is not None:
+            stats.first_token_at = stats.finished_at = time.perf_counter()
+            stats.new_tokens = result["new_tokens"]
+        return result["text"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ForFore batched inference worker")
+    parser.add_argument("--model-id", default="unsloth/Llama-3.2-11B-Vision-Instruct")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--cpu-mode", default="bfloat16", help="bfloat16, int8 or float32 (ignored on GPU)")
+    parser.add_argument("--num-threads", type=int, default=None,
+                        help="CPU intra-op threads for this process (default: FORFORE_NUM_THREADS, else PyTorch's)")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus /metrics on this port")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Address for --metrics-port to listen on")
+    args = parser.parse_args()
+    try:
+        authkey = worker_authkey()
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    if args.metrics_port:
+        from forfore.metrics import start_http_server
+
+        start_http_server(args.metrics_port, args.metrics_host)
+
+    from forfore.models import load_processor_and_model
+
+    processor, model = load_processor_and_model(args.model_id, cpu_mode=args.cpu_mode, num_threads=args.num_threads)
+    worker = InferenceWorker(
+        processor, model,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+        max_queue=args.max_queue,
+    )
+    print(f"ForFore worker serving {args.model_id} on {args.host}:{args.port}", flush=True)
+    worker.serve((args.host, args.port), authkey)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,267 +1,76 @@
+import math
+
+import numpy as np
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from forfore.job_data import get_job_store
+from forfore.salary import format_won
 
 # Page configuration
 st.set_page_config(page_title="Job Search", page_icon="🧑‍💼", layout="wide")
 
-# Sample job data (can be fetched from DB or API in production)
-@st.cache_data
-def load_job_data():
-    jobs = [
-        # ---------- SERVICE ----------
-        {
-            "id": 1,
-            "title": "Cafe Barista",
-            "company": "Starbucks Gangnam",
-            "location": "Seoul, Gangnam-gu",
-            "salary": "₩10,000 per hour",
-            "type": "Part-time",
-            "visa": ["F-2", "F-4", "F-5", "F-6"],
-            "description": "Looking for a friendly barista with a passion for coffee. Experience in coffee making is a plus.",
-            "requirements": "Intermediate Korean, available 5 days per week",
-            "posted": datetime.now() - timedelta(days=2),
-            "category": "Service"
-        },
-        {
-            "id": 2,
-            "title": "Restaurant Server",
-            "company": "Bonjuk by TheBorn Korea",
-            "location": "Seoul, Jongno-gu",
-            "salary": "₩9,500 per hour",
-            "type": "Part-time",
-            "visa": ["D-2", "D-4", "F-2", "F-4", "F-5", "F-6", "H-2"],
-            "description": "Serve food and assist customers in a Korean restaurant.",
-            "requirements": "Basic Korean communication, friendly attitude",
-            "posted": datetime.now() - timedelta(days=1),
-            "category": "Service"
-        },
-        {
-            "id": 3,
-            "title": "Convenience Store Night Shift",
-            "company": "CU Convenience Store",
-            "location": "Seoul, Gwanak-gu",
-            "salary": "₩11,000 per hour (including night bonus)",
-            "type": "Part-time",
-            "visa": ["D-2", "D-4", "F-2", "F-4", "F-5", "F-6", "H-2"],
-            "description": "Night shift position (10 PM – 6 AM). Cashier and stocking duties.",
-            "requirements": "Basic Korean, responsible personality",
-            "posted": datetime.now() - timedelta(hours=12),
-            "category": "Service"
-        },
-        {
-            "id": 4,
-            "title": "Hotel Waiter / Waitress",
-            "company": "Shilla Hotel",
-            "location": "Seoul, Jung-gu",
-            "salary": "₩10,500 per hour",
-            "type": "Part-time",
-            "visa": ["F-2", "F-4", "F-5", "F-6", "H-2"],
-            "description": "Serve guests at hotel restaurants and banquets.",
-            "requirements": "Intermediate Korean and English communication skills",
-            "posted": datetime.now() - timedelta(days=3),
-            "category": "Service"
-        },
-
-        # ---------- LOGISTICS / DELIVERY ----------
-        {
-            "id": 5,
-            "title": "Warehouse Packaging Staff",
-            "company": "Coupang Logistics Center",
-            "location": "Bucheon, Gyeonggi-do",
-            "salary": "₩12,000 per hour",
-            "type": "Short-term",
-            "visa": ["E-9", "H-2", "F-2", "F-4", "F-5"],
-            "description": "Work includes packing and preparing goods for shipment in a warehouse environment.",
-            "requirements": "Physically fit, basic Korean understanding",
-            "posted": datetime.now() - timedelta(days=1),
-            "category": "Logistics/Delivery"
-        },
-        {
-            "id": 6,
-            "title": "Delivery Rider",
-            "company": "Baemin Delivery",
-            "location": "Incheon, Namdong-gu",
-            "salary": "₩15,000 per delivery hour (average)",
-            "type": "Part-time",
-            "visa": ["H-2", "F-4", "F-5", "F-6"],
-            "description": "Deliver food orders around local neighborhoods using a motorbike.",
-            "requirements": "Motorcycle license, smartphone with GPS",
-            "posted": datetime.now() - timedelta(days=1),
-            "category": "Logistics/Delivery"
-        },
-        {
-            "id": 7,
-            "title": "Warehouse Loader",
-            "company": "CJ Logistics",
-            "location": "Gimpo, Gyeonggi-do",
-            "salary": "₩11,500 per hour",
-            "type": "Full-time",
-            "visa": ["E-9", "H-2", "F-4", "F-5"],
-            "description": "Loading and unloading parcels and organizing warehouse space.",
-            "requirements": "Physically strong and able to lift packages up to 20kg",
-            "posted": datetime.now() - timedelta(days=2),
-            "category": "Logistics/Delivery"
-        },
-
-        # ---------- IT / DEVELOPMENT ----------
-        {
-            "id": 8,
-            "title": "Backend Developer (Python/Django)",
-            "company": "Tech Startup Korea",
-            "location": "Seoul, Gangnam-gu",
-            "salary": "₩40M–₩60M per year",
-            "type": "Full-time",
-            "visa": ["E-7", "F-2", "F-5"],
-            "description": "We are looking for an experienced backend engineer to build scalable systems.",
-            "requirements": "3+ years of Python experience, AWS experience preferred",
-            "posted": datetime.now() - timedelta(days=7),
-            "category": "IT/Development"
-        },
-        {
-            "id": 9,
-            "title": "Frontend Developer (React)",
-            "company": "NextGen Web Labs",
-            "location": "Seoul, Mapo-gu",
-            "salary": "₩45M–₩65M per year",
-            "type": "Full-time",
-            "visa": ["E-7", "F-2", "F-5"],
-            "description": "Develop responsive web interfaces using React and TypeScript.",
-            "requirements": "2+ years frontend experience, portfolio preferred",
-            "posted": datetime.now() - timedelta(days=5),
-            "category": "IT/Development"
-        },
-        {
-            "id": 10,
-            "title": "Data Analyst Intern",
-            "company": "K-Digital Analytics",
-            "location": "Seoul, Seocho-gu",
-            "salary": "₩2,000,000 per month",
-            "type": "Internship",
-            "visa": ["D-2", "D-10", "F-2", "F-5", "F-6"],
-            "description": "Assist data team with SQL queries, dashboards, and basic data visualization.",
-            "requirements": "Knowledge of Python, Excel, and data analytics tools",
-            "posted": datetime.now() - timedelta(days=3),
-            "category": "IT/Development"
-        },
-
-        # ---------- EDUCATION ----------
-        {
-            "id": 11,
-            "title": "English Instructor",
-            "company": "ABC Language Academy",
-            "location": "Seoul, Songpa-gu",
-            "salary": "₩2,500,000 per month",
-            "type": "Full-time",
-            "visa": ["E-2", "F-2", "F-5", "F-6"],
-            "description": "Teach conversational English to elementary school students in small classes.",
-            "requirements": "Native-level English, teaching experience preferred",
-            "posted": datetime.now() - timedelta(days=5),
-            "category": "Education"
-        },
-        {
-            "id": 12,
-            "title": "Math Tutor",
-            "company": "Bright Minds Academy",
-            "location": "Seoul, Seongdong-gu",
-            "salary": "₩25,000 per hour",
-            "type": "Part-time",
-            "visa": ["F-2", "F-5", "F-6"],
-            "description": "Private tutoring for middle school math students. Materials provided.",
-            "requirements": "Fluent Korean or English, tutoring experience a plus",
-            "posted": datetime.now() - timedelta(days=2),
-            "category": "Education"
-        },
-
-        # ---------- MANUFACTURING ----------
-        {
-            "id": 13,
-            "title": "Factory Line Worker",
-            "company": "Samsung Electronics Partner",
-            "location": "Suwon, Gyeonggi-do",
-            "salary": "₩2,200,000 per month",
-            "type": "Full-time",
-            "visa": ["E-9", "H-2", "F-4", "F-5"],
-            "description": "Assemble electronic devices on production lines. Dormitory provided.",
-            "requirements": "Hardworking, night shift availability preferred",
-            "posted": datetime.now() - timedelta(days=4),
-            "category": "Manufacturing"
-        },
-        {
-            "id": 14,
-            "title": "Machine Operator",
-            "company": "Hyundai Precision Parts",
-            "location": "Ulsan, Nam-gu",
-            "salary": "₩2,500,000 per month",
-            "type": "Full-time",
-            "visa": ["E-9", "H-2", "F-4", "F-5"],
-            "description": "Operate metal-cutting and assembly machines in an auto parts plant.",
-            "requirements": "Basic Korean, manufacturing experience preferred",
-            "posted": datetime.now() - timedelta(days=3),
-            "category": "Manufacturing"
-        },
 
-        # ---------- MARKETING / PR ----------
-        {
-            "id": 15,
-            "title": "Marketing Intern",
-            "company": "Global Marketing Co.",
-            "location": "Seoul, Yeongdeungpo-gu",
-            "salary": "₩1,800,000 per month",
-            "type": "Internship",
-            "visa": ["D-2", "D-10", "F-2", "F-5", "F-6"],
-            "description": "Assist in social media marketing, content creation, and campaign analysis.",
-            "requirements": "Advanced Korean, interest in digital marketing",
-            "posted": datetime.now() - timedelta(days=2),
-            "category": "Marketing/PR"
-        },
-        {
-            "id": 16,
-            "title": "Social Media Manager",
-            "company": "Seoul Trend Agency",
-            "location": "Seoul, Gangnam-gu",
-            "salary": "₩3,000,000 per month",
-            "type": "Full-time",
-            "visa": ["E-7", "F-2", "F-5", "F-6"],
-            "description": "Manage Instagram, TikTok, and YouTube accounts for brand clients.",
-            "requirements": "Experience in influencer marketing, fluent English",
-            "posted": datetime.now() - timedelta(days=4),
-            "category": "Marketing/PR"
-        },
+def posted_ago(posted) -> str:
+    """Age of a listing at render time, so it stays right however long the data is cached."""
+    age = datetime.now() - posted
+    if age.days >= 1:
+        return f"{age.days} day{'s' if age.days > 1 else ''} ago"
+    hours = age.seconds // 3600
+    return f"{hours} hour{'s' if hours != 1 else ''} ago" if hours else "just now"
+
+
+# Load data: one shared snapshot of listings and indexes; newer postings are
+# merged in on a background thread and show up on a later rerun
+job_store = get_job_store()
+job_store.refresh_in_background()
+snapshot = job_store.snapshot
+df, search_index, facets = snapshot.df, snapshot.search, snapshot.facets
+
+# Current filter values, read before the widgets are drawn so every filter
+# can show how many listings each option would leave under the other filters
+search_query = st.session_state.get("job_search", "")
+selections = {
+    "location": st.session_state.get("job_location", "All"),
+    "category": st.session_state.get("job_category", "All"),
+    "type": st.session_state.get("job_type", "All"),
+    "visa": st.session_state.get("job_visa", []),
+}
+sort_by = st.session_state.get("job_sort", "Relevance")
+
+# Monthly pay range in millions of won, compared against the normalized salary columns
+monthly_min = df["salary_monthly_min"].to_numpy(dtype=float)
+monthly_max = df["salary_monthly_max"].to_numpy(dtype=float)
+top_pay = np.nanmax(monthly_max) / 1e6 if np.isfinite(monthly_max).any() else 1.0
+pay_bounds = (0.0, math.ceil(top_pay * 10) / 10)
+lo, hi = st.session_state.get("job_salary", pay_bounds)
+# Keep the slider valid when a data refresh changes the bounds
+st.session_state.job_salary = pay_range = (min(max(lo, 0.0), pay_bounds[1]), min(max(hi, 0.0), pay_bounds[1]))
+
+# Search results come back best match first; search and pay range narrow
+# every facet count, so they are combined into one base bitset
+matches = search_index.search(search_query) if search_query else None
+base_bits = facets.rows_bits(matches) if matches is not None else None
+if pay_range != pay_bounds:
+    # Listings without a comparable salary only show when the range is left open
+    pay_bits = facets.mask_bits((monthly_max >= pay_range[0] * 1e6) & (monthly_min <= pay_range[1] * 1e6))
+    base_bits = pay_bits if base_bits is None else base_bits & pay_bits
+
+
+def facet_caption(column: str, top: int = 5) -> str:
+    """
+    Listings per option under the other filters, shown under the widget. The
+    options themselves keep their raw values as labels: the browser sends the
+    label back, so a label containing a live count would stop matching.
+    """
+    counts = facets.counts(column, selections, base_bits)
+    total = counts.pop("All")
+    selected = selections[column] if isinstance(selections[column], list) else [selections[column]]
+    ranked = sorted(counts.items(), key=lambda item: (item[0] not in selected, -item[1]))
+    shown = [f"{value} {count:,}" for value, count in ranked[:max(top, len(selected))] if count or value in selected]
+    more = sum(1 for _, count in ranked[len(shown):] if count)
+    return f"{total:,} listing{'s' if total != 1 else ''}: " + " · ".join(shown) + (f" · +{more} more" if more else "")
 
-        # ---------- TRANSLATION / INTERPRETATION ----------
-        {
-            "id": 17,
-            "title": "Chinese Translator",
-            "company": "Global Translation Agency",
-            "location": "Seoul, Mapo-gu",
-            "salary": "Negotiable per project",
-            "type": "Freelance",
-            "visa": ["F-2", "F-4", "F-5", "F-6"],
-            "description": "Translation between Chinese and Korean. Remote work available.",
-            "requirements": "Native Chinese proficiency, 2+ years translation experience",
-            "posted": datetime.now() - timedelta(days=3),
-            "category": "Translation/Interpretation"
-        },
-        {
-            "id": 18,
-            "title": "Japanese Interpreter",
-            "company": "Korea Trade Center",
-            "location": "Busan, Haeundae-gu",
-            "salary": "₩250,000 per day",
-            "type": "Freelance",
-            "visa": ["F-2", "F-4", "F-5", "F-6"],
-            "description": "Interpret for business meetings between Korean and Japanese clients.",
-            "requirements": "Fluent in Japanese and Korean, experience in trade preferred",
-            "posted": datetime.now() - timedelta(days=2),
-            "category": "Translation/Interpretation"
-        },
-    ]
-    return pd.DataFrame(jobs)
-
-
-# Load data
-df = load_job_data()
 
 # Title
 st.title("🧑‍💼 Job Search")
@@ -272,62 +81,92 @@ with st.sidebar:
     st.header("🔍 Filters")
     
     # Search
-    search_query = st.text_input("🔎 Search", placeholder="Search by job title, company...")
+    st.text_input("🔎 Search", placeholder="Search by job title, company... (English or 한국어)", key="job_search")
     
     # Location filter
-    locations = ["All"] + sorted(df["location"].unique().tolist())
-    selected_location = st.selectbox("📍 Location", locations)
+    locations = ["All"] + facets.values["location"]
+    st.selectbox("📍 Location", locations, key="job_location")
+    st.caption(facet_caption("location"))
     
     # Category filter
-    categories = ["All"] + sorted(df["category"].unique().tolist())
-    selected_category = st.selectbox("💼 Category", categories)
+    categories = ["All"] + facets.values["category"]
+    st.selectbox("💼 Category", categories, key="job_category")
+    st.caption(facet_caption("category"))
     
     # Employment type filter
-    job_types = ["All"] + sorted(df["type"].unique().tolist())
-    selected_type = st.selectbox("⏰ Employment Type", job_types)
+    job_types = ["All"] + facets.values["type"]
+    st.selectbox("⏰ Employment Type", job_types, key="job_type")
+    st.caption(facet_caption("type"))
     
     # Visa type filter
-    all_visas = sorted(set([visa for visas in df["visa"] for visa in visas]))
-    selected_visa = st.multiselect("🛂 Visa Type", all_visas, help="Select your visa type")
+    st.multiselect("🛂 Visa Type", facets.values["visa"], key="job_visa", help="Select your visa type")
+    st.caption(facet_caption("visa"))
+
+    # Salary filter on the monthly equivalent (hourly pay x 209 hours, annual / 12)
+    st.slider(
+        "💰 Monthly Pay (₩ millions)", min_value=pay_bounds[0], max_value=pay_bounds[1], step=0.1,
+        format="₩%.1fM", key="job_salary",
+        help="Hourly, daily and annual salaries are converted to a monthly figure",
+    )
     
     st.markdown("---")
     st.caption("💡 Tip: Select multiple filters to find your perfect job match!")
 
-# Apply filters
-filtered_df = df.copy()
-
-# Search filter
-if search_query:
-    filtered_df = filtered_df[
-        filtered_df["title"].str.contains(search_query, case=False, na=False) |
-        filtered_df["company"].str.contains(search_query, case=False, na=False) |
-        filtered_df["description"].str.contains(search_query, case=False, na=False)
-    ]
+# Apply filters: one bitwise AND/OR per active filter, then keep the search ranking.
+# Only row positions are kept; rows are materialized for the visible page alone.
+# Other sort orders come pre-sorted with the snapshot, so ordering is one linear pass.
+mask = facets.mask(selections, base_bits)
+if sort_by in snapshot.orders:
+    order = snapshot.orders[sort_by]
+    result_rows = order[mask[order]]
+else:
+    result_rows = np.flatnonzero(mask) if matches is None else matches[mask[matches]]
 
-# Location filter
-if selected_location != "All":
-    filtered_df = filtered_df[filtered_df["location"] == selected_location]
+# Back to the first page whenever the filters change
+filter_key = (
+    search_query, pay_range, sort_by,
+    tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in selections.items()),
+)
+if st.session_state.get("job_filter_key") != filter_key:
+    st.session_state.job_filter_key = filter_key
+    st.session_state.job_page = 1
 
-# Category filter
-if selected_category != "All":
-    filtered_df = filtered_df[filtered_df["category"] == selected_category]
 
-# Employment type filter
-if selected_type != "All":
-    filtered_df = filtered_df[filtered_df["type"] == selected_type]
+def change_page(step: int):
+    st.session_state.job_page += step
 
-# Visa type filter
-if selected_visa:
-    filtered_df = filtered_df[filtered_df["visa"].apply(lambda x: any(v in x for v in selected_visa))]
 
 # Display results
-st.markdown(f"### Total {len(filtered_df)} Job Listings")
-
-if len(filtered_df) == 0:
+header, sort_col, view_col, size_col = st.columns([3, 1, 1, 1])
+header.markdown(f"### Total {len(result_rows):,} Job Listings")
+sort_col.selectbox("Sort by", ["Relevance", *snapshot.orders], key="job_sort")
+view_mode = view_col.radio("View", ["Cards", "Table"], horizontal=True, key="job_view")
+page_size = size_col.selectbox("Per page", [10, 25, 50, 100], key="job_page_size")
+
+total_pages = max(1, math.ceil(len(result_rows) / page_size))
+st.session_state.job_page = min(max(1, st.session_state.get("job_page", 1)), total_pages)
+page = st.session_state.job_page
+page_df = df.iloc[result_rows[(page - 1) * page_size:page * page_size]]
+
+if len(result_rows) == 0:
     st.info("🔍 No jobs found matching your criteria. Try adjusting your filters!")
+elif view_mode == "Table":
+    st.dataframe(
+        page_df.assign(
+            visa=page_df["visa"].map(", ".join),
+            posted=page_df["posted"].dt.strftime("%Y-%m-%d"),
+            monthly=[
+                # NaN != NaN, so unknown pay has to be caught before the range check
+                "–" if math.isnan(low) else format_won(low) if low == high else f"{format_won(low)}–{format_won(high)}"
+                for low, high in zip(page_df["salary_monthly_min"], page_df["salary_monthly_max"])
+            ],
+        )[["title", "company", "location", "salary", "monthly", "type", "category", "visa", "posted"]],
+        hide_index=True,
+        use_container_width=True,
+    )
 else:
     # Display job cards
-    for idx, row in filtered_df.iterrows():
+    for idx, row in page_df.iterrows():
         with st.container():
             col1, col2 = st.columns([3, 1])
             
@@ -340,6 +179,8 @@ else:
                 cols = st.columns(4)
                 cols[0].markdown(f"📍 {row['location']}")
                 cols[1].markdown(f"💰 {row['salary']}")
+                if row["salary_period"] != "month" and not math.isnan(row["salary_monthly_min"]):
+                    cols[1].caption(f"≈ {format_won(row['salary_monthly_min'])}/month")
                 cols[2].markdown(f"⏰ {row['type']}")
                 cols[3].markdown(f"📂 {row['category']}")
                 
@@ -351,7 +192,7 @@ else:
                     st.write(row['requirements'])
                     st.markdown(f"**Eligible Visa Types:**")
                     st.write(", ".join(row['visa']))
-                    st.markdown(f"**Posted:** {row['posted'].strftime('%Y-%m-%d')}")
+                    st.markdown(f"**Posted:** {row['posted'].strftime('%Y-%m-%d')} ({posted_ago(row['posted'])})")
             
             with col2:
                 # Action buttons
@@ -364,6 +205,14 @@ else:
             
             st.markdown("---")
 
+if total_pages > 1:
+    prev_col, page_col, next_col = st.columns([1, 3, 1])
+    prev_col.button("◀ Previous", on_click=change_page, args=(-1,), disabled=page <= 1, use_container_width=True)
+    page_col.markdown(
+        f"<div style='text-align: center'>Page {page} of {total_pages:,}</div>", unsafe_allow_html=True
+    )
+    next_col.button("Next ▶", on_click=change_page, args=(1,), disabled=page >= total_pages, use_container_width=True)
+
 # Bottom information
 st.markdown("---")
 st.info("""
@@ -1,21 +1,252 @@
 # run_app.py
-import subprocess, sys, time, threading
-import webview  # pywebview
+"""
+Desktop launcher: runs the Streamlit app in a child process and shows it in
+a native pywebview window.
+
+    python run_app.py [--port 8501] [--model-id ...] [--wait-model] [--no-window]
+
+Startup is made as short as possible without ever showing a blank window:
+
+- the child process starts warming the chat model and the job index before
+  Streamlit even begins serving, in the same process the pages run in, so
+  the first session finds them loaded (or loading);
+- the window opens as soon as /_stcore/health answers and the job index is
+  built (with --wait-model, also once the model is ready) instead of after
+  a fixed sleep;
+- the child is supervised: it is restarted if it crashes and terminated
+  when the window closes.
+
+Each step's time since launch is printed.
+"""
+import argparse
+import atexit
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
 
 PORT = "8501"
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "0_🤖_Chatbot.py")
+MODEL_ID = "unsloth/Llama-3.2-11B-Vision-Instruct"   # the chatbot page's default
+PREWARM_MARK = "forfore-prewarm:"
+HEALTH_TIMEOUT = 120.0
+MAX_RESTARTS = 5          # within RESTART_WINDOW seconds before giving up
+RESTART_WINDOW = 60.0
+
+
+# --------------------------
+# Child process: prewarm, then serve
+# --------------------------
+def _report(what: str, started: float) -> None:
+    # Parsed by the launcher; see Server._read_output
+    print(f"{PREWARM_MARK} {what} {time.perf_counter() - started:.2f}", flush=True)
+
+
+def prewarm(model_id: str, cpu_mode: str) -> None:
+    """Start loading the model and build the job index; reports each step as it finishes."""
+    started = time.perf_counter()
+    if model_id and not os.environ.get("FORFORE_WORKER_ADDRESS"):
+        from forfore.registry import get_registry
+
+        registry = get_registry()
+        registry.load_in_background(model_id, cpu_mode)
+
+        def wait_for_model():
+            while not registry.is_ready(model_id, cpu_mode):
+                error = registry.load_error(model_id, cpu_mode)
+                if error is not None:
+                    print(f"Model prewarm failed: {error}", file=sys.stderr, flush=True)
+                    _report("model-failed", started)
+                    return
+                time.sleep(0.25)
+            _report("model", started)
+
+        threading.Thread(target=wait_for_model, name="prewarm-model", daemon=True).start()
+
+    def warm_jobs():
+        from forfore.job_data import get_job_store
+
+        try:
+            get_job_store().snapshot
+            _report("jobs", started)
+        except Exception as e:
+            print(f"Job index prewarm failed: {e}", file=sys.stderr, flush=True)
+            _report("jobs-failed", started)
+            return
+        # Chat retrieval indexes: nice to have warm, but the window does not wait for them
+        try:
+            from forfore.job_retrieval import get_job_retriever
+            from forfore.knowledge import get_knowledge_base, has_knowledge_base
+
+            get_job_retriever(wait=True)
+            if has_knowledge_base():
+                get_knowledge_base().refresh()
+            _report("retrieval", started)
+        except Exception as e:
+            print(f"Retrieval index prewarm failed: {e}", file=sys.stderr, flush=True)
+
+    threading.Thread(target=warm_jobs, name="prewarm-jobs", daemon=True).start()
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    """Never outlive the launcher, even if it was killed before it could reap us."""
+    while os.getppid() == parent_pid:
+        time.sleep(1.0)
+    os._exit(0)
+
+
+def serve(port: str, model_id: str, cpu_mode: str) -> None:
+    from streamlit.web import cli as stcli
 
-def start_streamlit():
+    threading.Thread(target=_exit_with_parent, args=(os.getppid(),), daemon=True).start()
+    prewarm(model_id, cpu_mode)
     # --server.headless=true 로 콘솔만 띄우고, 브라우저 자동 오픈은 막음
-    cmd = [sys.executable, "-m", "streamlit", "run", "streamlit_app.py",
-           "--server.headless=true", "--server.port", PORT]
-    subprocess.Popen(cmd)
-
-def open_window():
-    # 스트림릿 서버가 뜨길 잠깐 기다렸다가 네이티브 창으로 열기
-    time.sleep(2)
-    webview.create_window("Chatbot", f"http://localhost:{PORT}", width=1100, height=800)
+    sys.argv = ["streamlit", "run", APP_SCRIPT, "--server.headless=true", "--server.port", port]
+    sys.exit(stcli.main())
+
+
+# --------------------------
+# Launcher: supervise the child
+# --------------------------
+class Server:
+    """The Streamlit child process, restarted if it exits while the launcher is running."""
+
+    def __init__(self, port: str, model_id: str, cpu_mode: str):
+        self.port = port
+        self.cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--port", port,
+                    "--model-id", model_id, "--cpu-mode", cpu_mode]
+        self.launched = time.perf_counter()
+        self.prewarmed: "dict[str, threading.Event]" = {
+            name: threading.Event() for name in ("jobs", "model", "retrieval")
+        }
+        self.failed = threading.Event()      # gave up restarting
+        self._proc = None
+        self._stopping = threading.Event()
+        self._restarts: list = []
+
+    def log(self, message: str) -> None:
+        print(f"[run_app {time.perf_counter() - self.launched:6.2f}s] {message}", flush=True)
+
+    def start(self) -> None:
+        threading.Thread(target=self._supervise, name="supervise-streamlit", daemon=True).start()
+
+    def _spawn(self):
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, encoding="utf-8", errors="replace", env=env)
+        threading.Thread(target=self._read_output, args=(proc,), daemon=True).start()
+        return proc
+
+    def _read_output(self, proc) -> None:
+        """Echo the child's output, picking out prewarm reports."""
+        for line in proc.stdout:
+            if line.startswith(PREWARM_MARK):
+                what, seconds = line[len(PREWARM_MARK):].split()
+                name = what.replace("-failed", "")
+                self.log(f"{name} prewarm {'failed' if what.endswith('-failed') else 'done'} "
+                         f"({float(seconds):.2f}s in the server)")
+                if name in self.prewarmed:
+                    self.prewarmed[name].set()
+            else:
+                sys.stdout.write(line)
+
+    def _supervise(self) -> None:
+        while not self._stopping.is_set():
+            self._proc = self._spawn()
+            self.log(f"started Streamlit (pid {self._proc.pid})")
+            code = self._proc.wait()
+            if self._stopping.is_set():
+                return
+            now = time.monotonic()
+            self._restarts = [t for t in self._restarts if now - t < RESTART_WINDOW] + [now]
+            if len(self._restarts) > MAX_RESTARTS:
+                self.log(f"Streamlit exited with code {code}; {MAX_RESTARTS} restarts in "
+                         f"{RESTART_WINDOW:.0f}s, giving up")
+                self.failed.set()
+                return
+            self.log(f"Streamlit exited with code {code}; restarting")
+            time.sleep(1.0)
+
+    def wait_healthy(self, timeout: float = HEALTH_TIMEOUT) -> bool:
+        """Poll Streamlit's health endpoint until it answers "ok"."""
+        url = f"http://localhost:{self.port}/_stcore/health"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.failed.is_set():
+            try:
+                with urllib.request.urlopen(url, timeout=1.0) as response:
+                    if response.status == 200:
+                        self.log("server healthy")
+                        return True
+            except OSError:
+                pass
+            time.sleep(0.05)
+        return False
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Terminate and reap the child."""
+        self._stopping.set()
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        self.log("Streamlit stopped")
+
+
+def open_window(url: str) -> None:
+    import webview  # pywebview
+
+    webview.create_window("Chatbot", url, width=1100, height=800)
     webview.start()
 
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", default=PORT)
+    parser.add_argument("--model-id", default=MODEL_ID, help="Model to prewarm; empty to skip")
+    parser.add_argument("--cpu-mode", default="bfloat16")
+    parser.add_argument("--wait-model", action="store_true",
+                        help="Open the window only once the model is loaded, not just the job index")
+    parser.add_argument("--no-window", action="store_true", help="Run the supervised server without a window")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.model_id, args.cpu_mode)
+        return
+
+    server = Server(args.port, args.model_id, args.cpu_mode)
+    atexit.register(server.stop)
+    server.start()
+    if not server.wait_healthy():
+        server.log("Streamlit did not become healthy; see the output above")
+        server.stop()
+        sys.exit(1)
+    for name in ("jobs", "model") if args.wait_model and args.model_id else ("jobs",):
+        # Both report failures too, so this only waits while they are still working
+        while not server.prewarmed[name].wait(0.25):
+            if server.failed.is_set():
+                sys.exit(1)
+
+    url = f"http://localhost:{args.port}"
+    if args.no_window:
+        server.log(f"ready at {url}")
+        try:
+            server.failed.wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        server.log("opening window")
+        # 창이 닫히면 반환되고, atexit 에서 서버 프로세스를 정리
+        open_window(url)
+    server.stop()
+
+
 if __name__ == "__main__":
-    threading.Thread(target=start_streamlit, daemon=True).start()
-    open_window()
\ No newline at end of file
+    main()
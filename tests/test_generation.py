@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks.tiny_model import build_tiny_model, sample_image_bytes  # noqa: E402
+from forfore.generation import build_inputs  # noqa: E402
+from forfore.image_cache import ImageFeatureCache  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def tiny():
+    return build_tiny_model()
+
+
+def test_inputs_from_cached_features_match_processor(tiny):
+    processor, model = tiny
+    image = sample_image_bytes(400, 300)
+    history = [("user", "Hi"), ("assistant", "Hello!")]
+    cache = ImageFeatureCache()
+
+    expected = build_inputs("What does this say?", io.BytesIO(image), processor, model, history)
+    first = build_inputs("What does this say?", io.BytesIO(image), processor, model, history, image_cache=cache)
+    again = build_inputs("What does this say?", io.BytesIO(image), processor, model, history, image_cache=cache)
+
+    assert cache.misses == 1 and cache.hits == 1
+    for inputs in (first, again):
+        assert sorted(inputs.keys()) == sorted(expected.keys())
+        for key in expected:
+            assert torch.equal(inputs[key], expected[key]), key
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from forfore.job_data import COLUMNS, JobStore, ParquetJobSource, SampleJobSource, SQLiteJobSource
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    source = SQLiteJobSource(str(path))
+    source.upsert(SampleJobSource().fetch(None).assign(updated_at=pd.Timestamp("2024-05-01 12:00:00")))
+    return path, source
+
+
+def _write(path, rows):
+    """Write (id, title, updated_at) rows straight into the table, as another program would."""
+    with sqlite3.connect(path) as conn:
+        conn.executemany("UPDATE jobs SET title = ?, updated_at = ? WHERE id = ?",
+                         [(title, updated_at, job_id) for job_id, title, updated_at in rows])
+
+
+def _titles(store):
+    df = store.snapshot.df
+    return dict(zip(df["id"], df["title"]))
+
+
+def test_refresh_picks_up_rows_written_in_the_watermark_second(db):
+    path, source = db
+    store = JobStore(source)
+    _write(path, [(1, "Barista", "2024-05-01T12:00:05")])
+    store.refresh()
+    assert store.snapshot.watermark == pd.Timestamp("2024-05-01 12:00:05")
+
+    # Same timestamp as the watermark: a strict `>` would never fetch it
+    _write(path, [(2, "Chef", "2024-05-01T12:00:05")])
+    assert store.refresh()
+    assert _titles(store)[1] == "Barista" and _titles(store)[2] == "Chef"
+
+
+def test_refresh_skips_rows_already_merged(db):
+    path, source = db
+    store = JobStore(source)
+    _write(path, [(1, "Barista", "2024-05-01T12:00:05")])
+    store.refresh()
+    version = store.snapshot.version
+
+    assert not store.refresh()
+    assert store.snapshot.version == version
+
+
+def test_refresh_compares_mixed_formats_and_offsets_as_instants(db):
+    path, source = db
+    store = JobStore(source)
+    _write(path, [(1, "Barista", "2024-05-01 12:00:05.250")])
+    store.refresh()
+
+    # 21:00:06+09:00 is 12:00:06 UTC: after the watermark, although it sorts before it as text
+    _write(path, [(2, "Chef", "2024-05-01T21:00:06+09:00"), (3, "Cook", "2024-05-01T12:00:01Z")])
+    store.refresh()
+    titles = _titles(store)
+    assert titles[2] == "Chef" and titles[3] != "Cook"
+    assert store.snapshot.watermark == pd.Timestamp("2024-05-01 12:00:06")
+
+
+def test_parquet_refresh_is_inclusive(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "jobs.parquet"
+    df = SampleJobSource().fetch(None).assign(updated_at=pd.Timestamp("2024-05-01 12:00:00"))
+    columns = list(COLUMNS)
+    df[columns].to_parquet(path)
+    store = JobStore(ParquetJobSource(str(path)))
+    store.snapshot
+
+    df.loc[df["id"] == 2, "title"] = "Chef"
+    df[columns].to_parquet(path)
+    assert store.refresh()
+    assert _titles(store)[2] == "Chef"
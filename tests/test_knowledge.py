@@ -0,0 +1,25 @@
+import logging
+
+from forfore.knowledge import MIN_SCORE, KnowledgeBase
+from forfore.retrieval import get_embedder
+
+
+def test_min_score_keeps_relevant_note_and_drops_irrelevant_one(tmp_path, caplog):
+    kb_dir = tmp_path / "knowledge"
+    kb_dir.mkdir()
+    (kb_dir / "d2.md").write_text(
+        "# D-2 student visa\n\nStudents may work part-time up to 25 hours a week with permission "
+        "from the immigration office.\n", encoding="utf-8",
+    )
+    (kb_dir / "garbage.md").write_text(
+        "# Garbage disposal\n\nUse standard bags sold at convenience stores. Food waste goes in "
+        "separate bins.\n", encoding="utf-8",
+    )
+    kb = KnowledgeBase(kb_dir=str(kb_dir), index_dir=str(tmp_path / "index"), embedder=get_embedder("hash"))
+
+    with caplog.at_level(logging.DEBUG, logger="forfore.knowledge"):
+        passages = kb.retrieve("How many hours can a D-2 student work part-time?")
+
+    assert [p["source"] for p in passages] == ["d2.md"]
+    assert passages[0]["score"] >= MIN_SCORE
+    assert "Dropped garbage.md" in caplog.text
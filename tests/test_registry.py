@@ -0,0 +1,85 @@
+import pytest
+
+from forfore.registry import GB, ModelBudgetExceeded, ModelRegistry
+
+
+class _Tensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class _Model:
+    def __init__(self, nbytes):
+        self._params = [_Tensor(nbytes)]
+
+    def parameters(self):
+        return self._params
+
+    def buffers(self):
+        return []
+
+
+SIZES = {"shared": 3 * GB, "small": 1 * GB, "medium": 4 * GB + GB // 2, "huge": 20 * GB}
+
+
+def _validate(model_id):
+    if model_id not in SIZES:
+        raise OSError(f"{model_id} is not a valid model identifier")
+
+
+def _load(model_id, cpu_mode="bfloat16", progress=None):
+    _validate(model_id)
+    return None, _Model(SIZES[model_id])
+
+
+def _registry(estimates):
+    return ModelRegistry(budget_bytes=5 * GB, loader=_load, validator=_validate,
+                         estimator=lambda model_id, cpu_mode: estimates.get(model_id))
+
+
+def _loaded(registry):
+    return [model_id for model_id, _, state, _, _ in registry.snapshot() if state == "ready"]
+
+
+def test_unknown_model_id_does_not_evict():
+    registry = _registry({"shared": 3 * GB})
+    with registry.use("shared"):
+        pass
+
+    with pytest.raises(OSError):
+        with registry.use("shraed"):
+            pass
+    assert _loaded(registry) == ["shared"]
+    assert isinstance(registry.load_error("shraed"), OSError)
+
+
+def test_unknown_size_loads_without_evicting_when_it_fits():
+    registry = _registry({"shared": 3 * GB})
+    with registry.use("shared"):
+        pass
+
+    with registry.use("small"):
+        pass
+    assert sorted(_loaded(registry)) == ["shared", "small"]
+
+
+def test_unknown_size_enforces_budget_from_real_footprint():
+    registry = _registry({"small": 1 * GB})
+    with registry.use("small"):
+        pass
+
+    with pytest.raises(ModelBudgetExceeded):
+        with registry.use("huge"):
+            pass
+    assert _loaded(registry) == ["small"]
+
+    # Fits once the idle model is gone
+    with registry.use("medium"):
+        pass
+    assert _loaded(registry) == ["medium"]
@@ -0,0 +1,51 @@
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks.tiny_model import build_tiny_model, sample_image_bytes  # noqa: E402
+from forfore.metrics import model_label  # noqa: E402
+from forfore.worker import InferenceWorker, WorkerClient, _Request  # noqa: E402
+
+
+def test_bad_image_fails_only_its_own_request():
+    processor, model = build_tiny_model()
+    worker = InferenceWorker(processor, model)
+    good = sample_image_bytes(400, 300)
+    batch = [
+        _Request("What does this say?", good, [], 4),
+        _Request("And this one?", b"not an image", [], 4),
+        _Request("Is this a contract?", good, [("user", "Hi"), ("assistant", "Hello!")], 4),
+    ]
+
+    worker._run_batch(batch)
+
+    assert "error" in batch[1].result
+    for req in (batch[0], batch[2]):
+        assert "error" not in req.result
+        assert req.result["batch_size"] == 2
+        assert req.result["new_tokens"] > 0
+
+
+def test_client_asks_worker_for_its_model_id():
+    processor, model = build_tiny_model()
+    model.name_or_path = "tiny/mllama"
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+    worker = InferenceWorker(processor, model)
+    threading.Thread(target=worker.serve, args=(address, b"secret"), daemon=True).start()
+
+    client = WorkerClient(address, authkey=b"secret")
+    for _ in range(50):
+        try:
+            assert client.model_id() == model_label(model) == "tiny/mllama"
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    else:
+        pytest.fail("worker did not start listening")